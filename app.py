@@ -5,13 +5,20 @@ import chess.svg
 from PIL import Image
 import numpy as np
 import os
+import queue
 import time
 import cv2  # Import OpenCV for camera operations
 
 # --- Import your actual classes from your project files ---
 # Make sure predictor.py and utils.py are in the same directory as this app.py
 try:
-    from predictor import ChessMovePredictor
+    from async_predictor import BackgroundPredictor
+    from camera import CameraStream, snapshot
+    from engine_pool import EnginePool
+    from position_cache import PositionCache
+    from predictor import ChessMovePredictor, DEFAULT_CACHE_PATH
+    from robot_link import RobotPublisher, robot_link_configured
+    from src.libs.model_registry import preload_models
     from utils import ChessBoard, decode_uci_to_json # Assuming ChessBoard is in utils.py
 except ImportError as e:
     st.error(f"Failed to import required modules: {e}. Make sure predictor.py and utils.py are in the correct directory.")
@@ -80,17 +87,31 @@ st.markdown("""
 # Use @st.cache_resource to initialize the models only once.
 @st.cache_resource
 def load_models():
-    predictor = ChessMovePredictor()
-    chess_board = ChessBoard()
-    return predictor, chess_board
+    # Engine processes and the analysis cache are shared by every browser session
+    engine_pool = EnginePool()
+    analysis_cache = PositionCache(DEFAULT_CACHE_PATH)
+    preload_models()
+    # One MQTT connection to the robot arm for the whole app, when a broker is configured
+    robot = RobotPublisher() if robot_link_configured() else None
+    return engine_pool, analysis_cache, robot
 
-predictor, chess_board = load_models()
+engine_pool, analysis_cache, robot = load_models()
+
+# Each session gets its own predictor on the shared pool, so tables search in parallel
+if 'predictor' not in st.session_state:
+    st.session_state.predictor = ChessMovePredictor(pool=engine_pool, cache=analysis_cache, ponder=True)
+predictor = st.session_state.predictor
+# Searches run on a worker thread so the page can show the analysis as it deepens
+if 'background_predictor' not in st.session_state:
+    st.session_state.background_predictor = BackgroundPredictor(predictor)
+background_predictor = st.session_state.background_predictor
 
 # --- Session State Initialization ---
 if 'game_started' not in st.session_state:
     st.session_state.game_started = False
 if 'board' not in st.session_state:
-    st.session_state.board = chess_board  # This is a ChessBoard instance
+    # One ChessBoard per session; the ONNX sessions behind it are shared process-wide
+    st.session_state.board = ChessBoard()
 if 'fen' not in st.session_state:
     st.session_state.fen = st.session_state.board.chess_board.fen()
 if 'image_captured' not in st.session_state:
@@ -103,6 +124,8 @@ if 'last_board_image_path' not in st.session_state:
     st.session_state.last_board_image_path = None
 if 'ai_move_json' not in st.session_state:
     st.session_state.ai_move_json = None
+if 'ai_move_source' not in st.session_state:
+    st.session_state.ai_move_source = None
 if 'show_camera_modal' not in st.session_state:
     st.session_state.show_camera_modal = False
 if 'camera_setup_done' not in st.session_state:
@@ -147,10 +170,35 @@ if 'camera_url' not in st.session_state:
 if 'preview_active' not in st.session_state:
     st.session_state.preview_active = False
 
+def search_with_progress(fen):
+    """Search `fen` in the background, showing depth, score and PV until the move is found."""
+    board = chess.Board(fen)
+    infos = queue.Queue()
+    future = background_predictor.submit(fen, on_info=infos.put)
+    progress = st.empty()
+    while not future.done() or not infos.empty():
+        try:
+            info = infos.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if info.get("pv"):
+            score = info.get("score")
+            progress.caption(
+                f"Depth {info.get('depth', '?')} | "
+                f"Score {score.white() if score is not None else '?'} | "
+                f"{board.variation_san(info['pv'][:6])}"
+            )
+    progress.empty()
+    return future.result()
+
 # Function to get available cameras
 def get_available_cameras(max_index=3):
     available = []
     for i in range(max_index+1):
+        # A device already held by a background stream cannot be probed again
+        if CameraStream.is_running(i):
+            available.append(i)
+            continue
         cap = cv2.VideoCapture(i)
         if cap is not None and cap.isOpened():
             available.append(i)
@@ -232,8 +280,9 @@ if st.session_state.show_camera_modal:
                 st.session_state.show_camera_modal = False
                 st.session_state.game_started = True
                 
-                # Reset the game
-                st.session_state.board = ChessBoard()
+                # Reset the game; the engine keeps its process and hash, only ucinewgame is sent
+                predictor.new_game()
+                st.session_state.board.reset()
                 st.session_state.fen = st.session_state.board.chess_board.fen()
                 st.session_state.image_captured = False
                 st.session_state.ai_move = None
@@ -246,22 +295,16 @@ if st.session_state.show_camera_modal:
                 # Show connecting message
                 with st.spinner("Connecting to camera..."):
                     if st.session_state.camera_source == 'usb':
-                        cap = cv2.VideoCapture(st.session_state.camera_index)
+                        camera_source = st.session_state.camera_index
                     else:
                         if not st.session_state.camera_url:
                             preview_placeholder.error("Please enter a camera URL first.")
                             st.session_state.preview_active = False
                             st.rerun()
-                        cap = cv2.VideoCapture(st.session_state.camera_url)
-                    
-                    if not cap.isOpened():
-                        preview_placeholder.error("Failed to open camera for preview. Please check your camera connection.")
-                        st.session_state.preview_active = False
-                        st.rerun()
+                        camera_source = st.session_state.camera_url
                     
-                    # Take a single snapshot
-                    ret, frame = cap.read()
-                    cap.release()
+                    # One-shot capture: cameras only previewed are not left streaming
+                    ret, frame = snapshot(camera_source)
                     
                     if not ret or frame is None:
                         preview_placeholder.error("Failed to capture frame. Check camera connection.")
@@ -346,28 +389,22 @@ else:
                 warning_message = None
                 with st.spinner("Capturing board, analyzing, and calculating AI move..."):
                     try:
-                        # Camera capture logic
-                        frame = None
+                        # Camera capture logic: a fresh frame from the shared stream
                         if st.session_state.camera_source == 'usb':
-                            cam_idx = st.session_state.camera_index
-                            cap = cv2.VideoCapture(cam_idx)
-                            ret, frame = cap.read()
-                            cap.release()
+                            camera_source = st.session_state.camera_index
                         else:
-                            cam_url = st.session_state.camera_url
-                            if not cam_url:
+                            camera_source = st.session_state.camera_url
+                            if not camera_source:
                                 error_message = "Camera URL is not set. Please set up your camera first."
                                 raise RuntimeError()
-                            cap = cv2.VideoCapture(cam_url)
-                            ret, frame = cap.read()
-                            cap.release()
-                        
-                        if frame is None or (not 'ret' in locals() or not ret):
+                        stream = CameraStream.get(camera_source)
+                        ret, frame = stream.read(fresh=True)
+
+                        if not ret:
                             error_message = "Failed to capture frame from the selected source. Check the camera or URL and try again."
                             raise RuntimeError()
-                        image_path = "chess_board_capture.jpeg"
-                        cv2.imwrite(image_path, frame)
-                        st.session_state.board.analyse_board(image_path)
+                        # Only changed squares are reclassified; a burst is fused when the move is unclear
+                        st.session_state.board.analyse_settled(frame, stream.burst)
                         if not st.session_state.board.chess_board.is_valid():
                             error_message = "Illegal move detected. Please ensure the board is set up correctly."
                             raise RuntimeError()
@@ -376,14 +413,21 @@ else:
                         if not st.session_state.board.chess_board.is_valid():
                             error_message = "The board state is invalid. Please check the board setup."
                             raise RuntimeError()
-                        best_move = predictor.predict_best_move(st.session_state.fen)
-                        with open("best_move.txt", "w") as f:
-                            f.write(best_move.uci())
+                        search_result = search_with_progress(st.session_state.fen)
+                        best_move = search_result.move
+                        st.session_state.ai_move_source = search_result.source
+                        if robot is None:
+                            # Without a broker the robot side still polls this file
+                            with open("best_move.txt", "w") as f:
+                                f.write(best_move.uci())
                         move_json = decode_uci_to_json(
                             st.session_state.fen, best_move.uci()
                         )
                         st.session_state.ai_move_json = move_json
                         if best_move and best_move in st.session_state.board.chess_board.legal_moves:
+                            if robot is not None:
+                                # Queued for the arm; delivery and acks happen in the background
+                                robot.send(move_json)
                             st.session_state.ai_move = best_move
                             st.session_state.board.make_move(
                                 "W" if st.session_state.board.chess_board.turn == chess.WHITE else "B",
@@ -425,6 +469,7 @@ else:
                     <p>Piece: <b>{st.session_state.ai_move_json.get('piece', '?')}</b></p>
                     <p>From: <b>{st.session_state.ai_move_json.get('from', '?')}</b> &rarr; To: <b>{st.session_state.ai_move_json.get('to', '?')}</b></p>
                     <p>Type: <b>{st.session_state.ai_move_json.get('type', "Default").capitalize()}</b></p>
+                    <p>Source: <b>{(st.session_state.ai_move_source or "engine").capitalize()}</b></p>
                     <p>Make this move on your physical board, then make your own move and capture the new board state.</p>
                 </div>
                 """,
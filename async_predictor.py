@@ -0,0 +1,131 @@
+import asyncio
+import concurrent.futures
+import functools
+import queue
+import threading
+
+from predictor import ChessMovePredictor
+
+_DONE = object()
+
+
+class AsyncChessMovePredictor:
+    """asyncio front end for a ChessMovePredictor.
+
+    Searches go through the wrapped predictor, so the opening book, the analysis
+    cache, a shared EnginePool, pondering and the metrics behave exactly as for
+    blocking callers; the blocking search runs on an executor thread. `stream()`
+    yields interim info dicts (depth, score, pv, ...) as the search deepens and
+    `predict()` returns the final SearchResult. Cancelling the task that awaits
+    either one stops the engine search.
+    """
+
+    def __init__(self, predictor=None, executor=None, **kwargs):
+        # Without a predictor, kwargs create one that this wrapper owns and closes
+        self._owns_predictor = predictor is None
+        self.predictor = predictor if predictor is not None else ChessMovePredictor(**kwargs)
+        self._executor = executor
+
+    async def predict(self, fen, clock=None, increment=0.0, on_info=None):
+        """Best move for `fen`; `on_info` is called from the search thread with each interim info."""
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        search = functools.partial(
+            self.predictor.analyse_position, fen, clock, increment, on_info=on_info, stop=stop
+        )
+        try:
+            return await loop.run_in_executor(self._executor, search)
+        except asyncio.CancelledError:
+            # The executor thread cannot be cancelled; make the engine search return instead
+            stop.set()
+            raise
+
+    async def stream(self, fen, clock=None, increment=0.0):
+        """Async iterator over interim engine info for `fen`.
+
+        Book and cache answers produce no interim info. Leaving the loop early
+        (or cancelling) stops the search.
+        """
+        loop = asyncio.get_running_loop()
+        infos = asyncio.Queue()
+        task = asyncio.ensure_future(self.predict(
+            fen, clock, increment, on_info=lambda info: loop.call_soon_threadsafe(infos.put_nowait, info)
+        ))
+        task.add_done_callback(lambda _: infos.put_nowait(_DONE))
+        try:
+            while True:
+                info = await infos.get()
+                if info is _DONE:
+                    break
+                yield info
+            task.result()
+        finally:
+            task.cancel()
+
+    async def close(self):
+        if self._owns_predictor:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.predictor.close)
+
+
+class BackgroundPredictor:
+    """Synchronous facade that runs a ChessMovePredictor's searches on a worker thread.
+
+    `submit()` starts a search and returns a `concurrent.futures.Future`, so the
+    caller can keep capturing frames or redrawing a UI while the engine thinks.
+    """
+
+    def __init__(self, predictor=None, **kwargs):
+        self._owns_predictor = predictor is None
+        self.predictor = predictor if predictor is not None else ChessMovePredictor(**kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="BackgroundPredictor")
+        self._stops = set()
+        self._lock = threading.Lock()
+
+    def submit(self, fen, clock=None, increment=0.0, on_info=None):
+        """Queue a search for `fen`; `on_info` is called from the worker thread with each interim info."""
+        stop = threading.Event()
+        with self._lock:
+            self._stops.add(stop)
+        future = self._executor.submit(
+            self.predictor.analyse_position, fen, clock, increment, on_info=on_info, stop=stop
+        )
+        future.add_done_callback(lambda _: self._discard(stop))
+        return future
+
+    def predict(self, fen, clock=None, increment=0.0, timeout=None):
+        return self.submit(fen, clock, increment).result(timeout)
+
+    def predict_best_move(self, fen):
+        return self.predict(fen).move
+
+    def stream(self, fen, clock=None, increment=0.0):
+        """Blocking generator over interim info; closing it early stops the search."""
+        infos = queue.Queue()
+        future = self.submit(fen, clock, increment, on_info=infos.put)
+        future.add_done_callback(lambda _: infos.put(_DONE))
+        try:
+            while True:
+                info = infos.get()
+                if info is _DONE:
+                    break
+                yield info
+            future.result()
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """Stop the running search early, with its best move so far, and any queued ones."""
+        with self._lock:
+            stops = list(self._stops)
+        for stop in stops:
+            stop.set()
+
+    def close(self):
+        self.cancel()
+        self._executor.shutdown(wait=True)
+        if self._owns_predictor:
+            self.predictor.close()
+
+    def _discard(self, stop):
+        with self._lock:
+            self._stops.discard(stop)
@@ -0,0 +1,189 @@
+import atexit
+import collections
+import threading
+import time
+
+import cv2
+
+
+class CameraStream:
+    """Background frame grabber shared by every caller of the same source.
+
+    Opening a USB or RTSP device is slow and the first buffered frame is often
+    stale, so each source is opened once and a daemon thread keeps reading
+    from it. `read()` then returns the newest frame from memory. Streams are
+    singletons per source: use `CameraStream.get(source)` rather than the
+    constructor so Streamlit reruns and `main.py` share the same device.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, source, buffer_size=4, reconnect_delay=0.5, max_reconnect_delay=10.0):
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        # Ring buffer of (timestamp, frame), newest last
+        self._frames = collections.deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.connected = False
+        self.frames_read = 0
+        self.reconnects = 0
+
+    @classmethod
+    def get(cls, source, **kwargs):
+        """Return the running stream for `source`, starting it on first use."""
+        key = int(source) if isinstance(source, str) and source.isdigit() else source
+        with cls._instances_lock:
+            stream = cls._instances.get(key)
+            if stream is None or stream.closed:
+                stream = cls(key, **kwargs)
+                stream.start()
+                cls._instances[key] = stream
+            return stream
+
+    @classmethod
+    def is_running(cls, source):
+        key = int(source) if isinstance(source, str) and source.isdigit() else source
+        with cls._instances_lock:
+            stream = cls._instances.get(key)
+            return stream is not None and not stream.closed
+
+    @classmethod
+    def close_all(cls):
+        with cls._instances_lock:
+            streams = list(cls._instances.values())
+            cls._instances.clear()
+        for stream in streams:
+            stream.close()
+
+    @property
+    def closed(self):
+        return self._stop.is_set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"CameraStream({self.source})", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def read(self, timeout=5.0, fresh=False):
+        """Return (ret, frame) like `cv2.VideoCapture.read`.
+
+        With `fresh`, wait for a frame grabbed after this call instead of
+        returning the newest buffered one.
+        """
+        since = time.monotonic() if fresh else None
+        item = self._wait_for_frame(since, timeout)
+        if item is None:
+            return False, None
+        return True, item[1]
+
+    def burst(self, count, timeout=5.0):
+        """Return up to `count` successive frames, all grabbed after this call.
+
+        Fewer are returned when the stream stalls for `timeout` seconds in total.
+        """
+        frames = []
+        since = time.monotonic()
+        deadline = since + timeout
+        while len(frames) < count:
+            item = self._wait_for_frame(since, deadline - time.monotonic())
+            if item is None:
+                break
+            since = item[0]
+            frames.append(item[1])
+        return frames
+
+    def latest(self):
+        """Newest (timestamp, frame) pair without waiting, or None."""
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def _wait_for_frame(self, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._stop.is_set():
+                if self._frames and (since is None or self._frames[-1][0] > since):
+                    return self._frames[-1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        return None
+
+    def _run(self):
+        cap = None
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            if cap is None:
+                cap = cv2.VideoCapture(self.source)
+                if not cap.isOpened():
+                    cap.release()
+                    cap = None
+                    self.connected = False
+                    # Back off so an unreachable IP camera is not hammered
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                self.connected = True
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                cap.release()
+                cap = None
+                self.connected = False
+                self.reconnects += 1
+                # A camera that accepts connections but sends no frames backs off too
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            # Only a frame actually read proves the source is healthy again
+            delay = self.reconnect_delay
+
+            with self._cond:
+                self._frames.append((time.monotonic(), frame))
+                self.frames_read += 1
+                self._cond.notify_all()
+
+        if cap is not None:
+            cap.release()
+        self.connected = False
+
+
+def snapshot(source, warmup_frames=3):
+    """Return (ret, frame) from `source` without leaving a stream running.
+
+    A source that already has a running stream is read from it; otherwise the
+    device is opened just for this frame and released again, so previewing a
+    camera that is not picked does not keep it open. The first frames after
+    opening are often stale, so `warmup_frames` are grabbed and dropped.
+    """
+    key = int(source) if isinstance(source, str) and source.isdigit() else source
+    if CameraStream.is_running(key):
+        return CameraStream.get(key).read(fresh=True)
+    cap = cv2.VideoCapture(key)
+    try:
+        if not cap.isOpened():
+            return False, None
+        for _ in range(warmup_frames):
+            cap.grab()
+        return cap.read()
+    finally:
+        cap.release()
+
+
+atexit.register(CameraStream.close_all)
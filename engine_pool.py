@@ -0,0 +1,233 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+import chess.engine
+
+from src.utils import metrics
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("engine_pool")
+
+ENGINE_DIR = os.path.join(os.path.dirname(__file__), 'engine')
+DEFAULT_ENGINE_PATH = os.environ.get(
+    "CHESS_ENGINE_PATH", os.path.join(ENGINE_DIR, 'stockfish-ubuntu-x86-64-avx2')
+)
+DEFAULT_POOL_SIZE = int(os.environ.get("CHESS_ENGINE_POOL_SIZE", 2))
+DEFAULT_THREADS = int(os.environ.get("CHESS_ENGINE_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+DEFAULT_HASH_MB = int(os.environ.get("CHESS_ENGINE_HASH_MB", 128))
+DEFAULT_MOVE_OVERHEAD_MS = int(os.environ.get("CHESS_ENGINE_MOVE_OVERHEAD_MS", 30))
+DEFAULT_ENGINE_OPTIONS = {
+    "Threads": DEFAULT_THREADS,
+    "Hash": DEFAULT_HASH_MB,
+    "Move Overhead": DEFAULT_MOVE_OVERHEAD_MS,
+}
+# Depth of the throwaway search that loads the network and touches the hash at startup
+WARMUP_DEPTH = 10
+
+
+def open_engine(engine_path=DEFAULT_ENGINE_PATH, options=None):
+    """Start a UCI engine and apply whichever of `options` it supports."""
+    engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    options = DEFAULT_ENGINE_OPTIONS if options is None else options
+    supported = {name: value for name, value in options.items() if name in engine.options}
+    if supported:
+        engine.configure(supported)
+    return engine
+
+
+def warm_up_engine(engine, depth=WARMUP_DEPTH, game=None):
+    """Run a short search so NNUE loading and hash allocation are paid before the first move.
+
+    Returns the seconds it took.
+    """
+    started = time.monotonic()
+    engine.analyse(chess.Board(), chess.engine.Limit(depth=depth), game=game)
+    return time.monotonic() - started
+
+
+def engine_alive(engine):
+    return not engine.protocol.returncode.done()
+
+
+class EnginePool:
+    """A fixed-size pool of engine processes shared by concurrent sessions.
+
+    Callers check an engine out, run their search and check it back in.
+    When all engines are busy, up to `max_waiters` callers queue for one and
+    give up after `timeout` seconds. Dead engines are restarted on checkout,
+    and engines that failed mid-search are restarted on checkin.
+    """
+
+    def __init__(self, engine_path=DEFAULT_ENGINE_PATH, size=DEFAULT_POOL_SIZE, threads=1,
+                 hash_mb=DEFAULT_HASH_MB, max_waiters=16, timeout=30.0, options=None, warm_up=True):
+        self.engine_path = engine_path
+        self.options = dict(DEFAULT_ENGINE_OPTIONS, Threads=threads, Hash=hash_mb, **(options or {}))
+        self.size = size
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._owners = {}
+        self._previous_owners = {}
+        self._waiting = 0
+        self._closed = False
+        self.restarts = 0
+        self.checkouts = 0
+        self.timeouts = 0
+
+        log_event(log, "engine_pool_starting", size=size, path=engine_path)
+        started = time.monotonic()
+        for _ in range(size):
+            self._idle.append(open_engine(engine_path, self.options))
+        self.startup_time = time.monotonic() - started
+
+        # Warm every engine up in the background; checkouts wait for it through is_ready()
+        self.warmup_time = None
+        self._ready = threading.Event()
+        if warm_up:
+            threading.Thread(target=self._warm_up_all, name="EnginePoolWarmup", daemon=True).start()
+        else:
+            self._ready.set()
+
+    def checkout(self, timeout=None, prefer=None, owner=None):
+        """Take an idle engine, preferring `prefer` (e.g. the one still pondering for `owner`).
+
+        Raises TimeoutError when none frees up within `timeout` seconds and
+        RuntimeError when the wait queue is already full.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Engine pool is closed")
+            if not self._idle and self._waiting >= self.max_waiters:
+                raise RuntimeError(f"Engine pool wait queue is full ({self._waiting} waiting)")
+            self._waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self._idle or self._closed, timeout):
+                    self.timeouts += 1
+                    metrics.inc("engine_checkout_timeouts")
+                    raise TimeoutError(f"No engine became available within {timeout:.1f}s")
+                if self._closed:
+                    raise RuntimeError("Engine pool is closed")
+            finally:
+                self._waiting -= 1
+
+            if prefer is not None and prefer in self._idle:
+                self._idle.remove(prefer)
+                engine = prefer
+            else:
+                engine = self._idle.popleft()
+            self.checkouts += 1
+
+        if not engine_alive(engine):
+            engine = self._restart(engine)
+
+        with self._cond:
+            self._previous_owners[engine] = self._owners.get(engine)
+            self._owners[engine] = owner
+        metrics.observe("engine_checkout_seconds", time.perf_counter() - started)
+        return engine
+
+    def checkin(self, engine, failed=False):
+        """Return an engine; `failed` engines (or dead ones) are replaced by a fresh process."""
+        if failed or not engine_alive(engine):
+            engine = self._restart(engine)
+        with self._cond:
+            if self._closed:
+                engine.close()
+                return
+            self._idle.append(engine)
+            self._cond.notify()
+
+    def previous_owner(self, engine):
+        """Owner of `engine` before its current checkout."""
+        with self._cond:
+            return self._previous_owners.get(engine)
+
+    def health_check(self):
+        """Ping every idle engine and restart those that do not answer. Returns the restart count."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        restarted = 0
+        healthy = []
+        for engine in idle:
+            try:
+                engine.ping()
+            except (chess.engine.EngineError, chess.engine.EngineTerminatedError, TimeoutError):
+                engine = self._restart(engine)
+                restarted += 1
+            healthy.append(engine)
+        with self._cond:
+            self._idle.extend(healthy)
+            self._cond.notify(len(healthy))
+        return restarted
+
+    def is_ready(self, timeout=0):
+        """Readiness probe: True once warm-up finished and every engine process is alive."""
+        if not self._ready.wait(timeout):
+            return False
+        with self._cond:
+            engines = list(self._idle)
+        return all(engine_alive(engine) for engine in engines)
+
+    def _warm_up_all(self):
+        started = time.monotonic()
+        engines = [self.checkout(timeout=None) for _ in range(self.size)]
+        try:
+            threads = [threading.Thread(target=warm_up_engine, args=(engine,)) for engine in engines]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for engine in engines:
+                self.checkin(engine)
+            self.warmup_time = time.monotonic() - started
+            self._ready.set()
+            log_event(log, "engine_pool_ready", seconds=round(self.startup_time + self.warmup_time, 2))
+
+    def queue_depth(self):
+        with self._cond:
+            return self._waiting
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "queue_depth": self._waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                "startup_s": self.startup_time,
+                "warmup_s": self.warmup_time,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for engine in idle:
+            engine.quit()
+
+    def _restart(self, engine):
+        metrics.inc("engine_restarts")
+        log_event(log, "engine_restarting", logging.WARNING)
+        try:
+            engine.close()
+        except Exception:
+            pass
+        replacement = open_engine(self.engine_path, self.options)
+        with self._cond:
+            self.restarts += 1
+            self._owners.pop(engine, None)
+            self._previous_owners.pop(engine, None)
+        return replacement
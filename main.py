@@ -1,27 +1,45 @@
 # main.py
+import time
+
 import chess
+from camera import CameraStream
 from predictor import ChessMovePredictor
+from robot_link import RobotPublisher, robot_link_configured
+from search_policy import HybridPolicy
+from src.libs.board_motion import SETTLE_TIME, BoardMotionDetector
+from src.utils import metrics
+from src.utils.metrics import get_logger, log_event
 from utils import decode_uci_to_json, ChessBoard
-import cv2
 
+log = get_logger("main")
+
+CAMERA_RETRY_DELAY = 0.1  # seconds to wait before reading again while the camera is down
 
-predictor = ChessMovePredictor()
+
+# The robot loop needs a bounded time-to-move rather than a fixed depth
+predictor = ChessMovePredictor(ponder=True, policy=HybridPolicy(min_depth=10, max_time=2.0))
 board = ChessBoard()
 
-cap = cv2.VideoCapture(2)
+camera = CameraStream.get(2)
+
 
+def play(frame=None):
+    # Analyse the given BGR frame, or a fresh camera frame (plus a burst when in doubt)
+    if frame is None:
+        ret, frame = camera.read(fresh=True)
+        if not ret:
+            error_message = (
+                "Failed to capture frame from the feed. Check the URL and try again."
+            )
+            raise RuntimeError(error_message)
+        board_fen = board.analyse_settled(frame, camera.burst)
+    else:
+        board_fen = board.analyse_board(frame)
+    return respond(board_fen)
 
-def play():
-    ret, frame = cap.read()
-    cap.release()
-    if not ret or frame is None:
-        error_message = (
-            "Failed to capture frame from the feed. Check the URL and try again."
-        )
-        raise RuntimeError(error_message)
-    image_path = "chess_board_capture.jpeg"
-    cv2.imwrite(image_path, frame)
-    board_fen = board.analyse_board(image_path)
+
+def respond(board_fen):
+    """Pick the engine's reply to `board_fen`, record it on the board and describe it for the robot."""
     best_move = predictor.predict_best_move(board_fen)
     board.make_move(
         "W" if board.chess_board.turn == chess.WHITE else "B",
@@ -29,3 +47,57 @@ def play():
     )
     move_json = decode_uci_to_json(board_fen, best_move.uci())
     return move_json
+
+
+def new_game():
+    board.reset()
+    predictor.new_game()
+
+
+def watch(on_move=None, settle_time=SETTLE_TIME, stop_event=None):
+    """Continuous mode: reply automatically whenever the board settles after a human move.
+
+    A cheap motion detector looks at every camera frame; the models and the
+    engine only run once the board has been still for `settle_time` seconds
+    after a change. `on_move` receives each reply (the `play` result).
+    """
+    detector = BoardMotionDetector(settle_time=settle_time)
+    ret, frame = camera.read()
+    if ret:
+        # Locate the board up front so the detector watches the board, not the whole frame
+        board.corner_tracker.locate(frame)
+
+    while stop_event is None or not stop_event.is_set():
+        ret, frame = camera.read(fresh=True)
+        if not ret:
+            time.sleep(CAMERA_RETRY_DELAY)
+            continue
+        if not detector.update(frame, board.corner_tracker.matrix(detector.size)):
+            continue
+
+        metrics.inc("auto_triggers")
+        moves_before = len(board.chess_board.move_stack)
+        try:
+            # Incremental on the settled frame; more frames of the still board only when in doubt
+            board_fen = board.analyse_settled(frame, camera.burst)
+        except ValueError as e:
+            log_event(log, "auto_analysis_failed", error=str(e))
+            # Retry the same still board a few times with backoff, then wait for the board to move
+            detector.rearm()
+            continue
+        # No new move: the robot finished our own move, or the change was not a move
+        if len(board.chess_board.move_stack) == moves_before or board.chess_board.is_game_over():
+            continue
+
+        move_json = respond(board_fen)
+        if on_move is not None:
+            on_move(move_json)
+
+
+if __name__ == "__main__":
+    if robot_link_configured():
+        # Replies go straight to the arm over MQTT (CHESS_MQTT_HOST)
+        with RobotPublisher() as robot:
+            watch(on_move=robot.send)
+    else:
+        watch(on_move=print)
@@ -0,0 +1,146 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import chess
+import chess.polyglot
+
+
+class PositionCache:
+    """Two-tier cache of engine analyses: an in-process LRU backed by sqlite.
+
+    Entries are keyed on the position's Zobrist hash plus the kind of search
+    limit, and remember the depth they were searched to. A lookup only hits
+    when the stored depth is at least the requested one. The sqlite tier is
+    optional (`path=None`) and survives restarts; both tiers are size bounded.
+    """
+
+    def __init__(self, path=None, max_memory_entries=4096, max_disk_entries=200_000):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " key TEXT PRIMARY KEY, epd TEXT NOT NULL, depth INTEGER NOT NULL,"
+                " pv TEXT NOT NULL, score_cp INTEGER, score_mate INTEGER, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)")
+            self._db.commit()
+
+    @staticmethod
+    def key(board, limit_kind="depth"):
+        return f"{chess.polyglot.zobrist_hash(board):016x}:{limit_kind}"
+
+    def get(self, board, min_depth=0, limit_kind="depth"):
+        """Return the cached entry dict for `board` searched to at least `min_depth`, or None.
+
+        Entries hold "pv" (list of UCI strings), "depth", and the score from the side
+        to move's point of view as "score_cp" / "score_mate" (one of them is None).
+        """
+        key = self.key(board, limit_kind)
+        epd = board.epd()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry["epd"] == epd and entry["depth"] >= min_depth:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT epd, depth, pv, score_cp, score_mate FROM analyses WHERE key = ?", (key,)
+                ).fetchone()
+                # The stored EPD guards against Zobrist collisions
+                if row is not None and row[0] == epd and row[1] >= min_depth:
+                    entry = {
+                        "epd": row[0], "depth": row[1], "pv": row[2].split(),
+                        "score_cp": row[3], "score_mate": row[4],
+                    }
+                    self._db.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, board, pv, depth, score_cp=None, score_mate=None, limit_kind="depth"):
+        if not pv:
+            return
+        key = self.key(board, limit_kind)
+        entry = {
+            "epd": board.epd(), "depth": depth, "pv": list(pv),
+            "score_cp": score_cp, "score_mate": score_mate,
+        }
+        with self._lock:
+            current = self._memory.get(key)
+            if current is not None and current["epd"] == entry["epd"] and current["depth"] > depth:
+                return
+            self._remember(key, entry)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO analyses (key, epd, depth, pv, score_cp, score_mate, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET epd = excluded.epd, depth = excluded.depth,"
+                    " pv = excluded.pv, score_cp = excluded.score_cp, score_mate = excluded.score_mate,"
+                    " last_used = excluded.last_used"
+                    " WHERE excluded.depth >= analyses.depth OR excluded.epd != analyses.epd",
+                    (key, entry["epd"], depth, " ".join(pv), score_cp, score_mate, time.time()),
+                )
+                self._db.commit()
+                self._puts_since_evict += 1
+                # Counting rows on every insert is wasteful; trim in batches
+                if self._puts_since_evict >= 256:
+                    self._evict_disk()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._evict_disk()
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        self._puts_since_evict = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM analyses WHERE key IN"
+                " (SELECT key FROM analyses ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._db.commit()
@@ -1,23 +1,378 @@
+import collections
+import contextlib
+import logging
 import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import chess
 import chess.engine
+import chess.polyglot
+
+from engine_pool import ENGINE_DIR, DEFAULT_ENGINE_PATH, engine_alive, open_engine, warm_up_engine
+from position_cache import PositionCache
+from search_policy import FixedDepth
+from src.utils import metrics
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("predictor")
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "CHESS_ANALYSIS_CACHE", os.path.join(ENGINE_DIR, 'analysis_cache.sqlite')
+)
+DEFAULT_BOOK_PATH = os.environ.get("CHESS_OPENING_BOOK", os.path.join(ENGINE_DIR, 'book.bin'))
+BOOK_POLICIES = ("best", "weighted", "uniform")
+
+
+@dataclass
+class SearchResult:
+    move: chess.Move
+    pv: List[chess.Move] = field(default_factory=list)
+    score: Optional[chess.engine.PovScore] = None
+    depth: Optional[int] = None
+    source: str = "engine"  # where the move came from: "book", "cache" or "engine"
+    nodes: Optional[int] = None
+    nps: Optional[int] = None
+    time: Optional[float] = None  # wall-clock seconds spent producing the move
+
 
 class ChessMovePredictor:
-    def __init__(self, stockfish_path=None, depth=15):
-        if stockfish_path is None:
-            stockfish_path = os.path.join(
-                os.path.dirname(__file__), 
-                'engine', 
-                'stockfish-ubuntu-x86-64-avx2'
-            )
-        print(f"Loading Stockfish from: {stockfish_path}")
-        self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+    def __init__(self, stockfish_path=None, depth=15, cache_path=DEFAULT_CACHE_PATH, cache=None,
+                 book_path=DEFAULT_BOOK_PATH, book_policy="best", max_book_ply=20, ponder=False,
+                 pool=None, policy=None, engine_options=None, warm_up=True):
+        # With a shared EnginePool each search checks an engine out of the pool;
+        # otherwise the predictor owns a single engine process
+        self.pool = pool
+        self.engine = None
+        self._engine_lock = threading.Lock()
+        self.startup_time = None
+        self.warmup_time = None
+        self.first_move_time = None
+        if pool is None:
+            if stockfish_path is None:
+                stockfish_path = DEFAULT_ENGINE_PATH
+            log_event(log, "engine_loading", path=stockfish_path)
+            started = time.monotonic()
+            self.engine = open_engine(stockfish_path, engine_options)
+            self.startup_time = time.monotonic() - started
+            log_event(log, "engine_loaded", seconds=round(self.startup_time, 2))
         self.depth = depth
-        print("Stockfish loaded.")
+        # How long to search; the default keeps the historical fixed depth
+        self.policy = policy if policy is not None else FixedDepth(depth)
+        self.search_log = collections.deque(maxlen=1000)  # recent engine SearchResults
+        # Pass a shared PositionCache to pool analyses between predictors;
+        # cache_path="" keeps the cache in memory only
+        self._owns_cache = cache is None
+        self.cache = cache if cache is not None else PositionCache(cache_path or None)
+
+        # Opening book, kept open (memory-mapped) for the life of the predictor
+        if book_policy not in BOOK_POLICIES:
+            raise ValueError(f"Unknown book policy {book_policy!r}, expected one of {BOOK_POLICIES}")
+        self.book_policy = book_policy
+        self.max_book_ply = max_book_ply
+        self.book = None
+        if book_path and os.path.exists(book_path):
+            self.book = chess.polyglot.open_reader(book_path)
+            log_event(log, "book_loaded", path=book_path)
+        self.move_sources = collections.Counter()
+
+        # Pondering: after each move the engine keeps searching the position after
+        # the expected reply until the next request arrives
+        self.ponder = ponder
+        self._game = object()  # python-chess only sends ponderhit within the same game
+        # (board after expected reply, engine, start time, open analysis for streaming policies)
+        self._pondering = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.ponder_time_saved = 0.0
+        self._unaided_search_time = None
+
+        # Warm the engine up in the background so the first real move does not pay
+        # for network loading and hash allocation; searches wait on the engine lock
+        self._ready = threading.Event()
+        if warm_up and self.engine is not None:
+            threading.Thread(target=self._warm_up, name="EngineWarmup", daemon=True).start()
+        else:
+            self._ready.set()
 
     def predict_best_move(self, fen):
+        return self.analyse_position(fen).move
+
+    def analyse_position(self, fen, clock=None, increment=0.0, on_info=None, stop=None):
+        """Best move for `fen` as a SearchResult, from the book, the cache or the engine.
+
+        `clock` and `increment` (seconds) are the side to move's remaining time,
+        used by the search policy to size the search. An engine search calls
+        `on_info` with each interim info dict (depth, score, pv, ...) and ends
+        early, with the best move so far, once the `stop` event is set.
+        """
         board = chess.Board(fen)
-        result = self.engine.analyse(board, chess.engine.Limit(depth=self.depth))
-        return result["pv"][0]
+        started = time.monotonic()
+        result = self._search(board, clock, increment, on_info, stop)
+        result.time = time.monotonic() - started
+        if self.first_move_time is None:
+            self.first_move_time = result.time
+            log_event(
+                log, "first_move", seconds=round(result.time, 3), source=result.source,
+                warmed_up=self.warmup_time is not None,
+            )
+        self.move_sources[result.source] += 1
+        metrics.observe("search_seconds", result.time, source=result.source)
+        log_event(
+            log, "move_predicted", logging.DEBUG, move=result.move.uci(), source=result.source,
+            depth=result.depth, seconds=round(result.time, 3),
+        )
+        if result.source == "engine":
+            self.search_log.append(result)
+        return result
+
+    def _search(self, board, clock=None, increment=0.0, on_info=None, stop=None):
+        pondering, self._pondering = self._pondering, None
+
+        book_move = self._book_move(board)
+        if book_move is not None:
+            self._stop_pondering(pondering, board)
+            return SearchResult(move=book_move, pv=[book_move], source="book")
+
+        cached = self.cache.get(board, min_depth=self.policy.min_depth)
+        if cached is not None:
+            self._stop_pondering(pondering, board)
+            return self._from_cache(board, cached)
+
+        limit = self.policy.limit(board, clock, increment)
+        prefer = pondering[1] if pondering else None
+        with self._checkout_engine(prefer=prefer) as engine:
+            engine_started = time.monotonic()
+            head_start = None  # seconds the engine already spent on this position while pondering
+            if self.policy.streaming or on_info is not None or stop is not None:
+                # A ponder hit resumes the analysis that has been running since the last move
+                analysis, started = None, None
+                if pondering is not None and pondering[3] is None:
+                    # A play() ponder cannot be resumed as an analysis; the new search cancels it
+                    self._count_ponder(pondering, board)
+                elif self._ponder_hit(pondering, board, engine):
+                    analysis, started = pondering[3], pondering[2]
+                    head_start = time.monotonic() - started
+                info = self._search_streaming(engine, board, limit, analysis, started, on_info, stop)
+                pv = info["pv"]
+                if self.ponder and len(pv) >= 2:
+                    ponder_board = board.copy()
+                    ponder_board.push(pv[0])
+                    ponder_board.push(pv[1])
+                    self._pondering = (
+                        ponder_board, engine, time.monotonic(),
+                        engine.analysis(ponder_board, game=self._game),
+                    )
+            elif self.ponder:
+                # Searching the pondered board (same move stack) turns the ponder into a ponderhit
+                search_board = self._ponder_hit(pondering, board, engine) or board
+                head_start = time.monotonic() - pondering[2] if search_board is not board else None
+                played = engine.play(
+                    search_board, limit, ponder=True, game=self._game, info=chess.engine.INFO_ALL
+                )
+                info = played.info
+                pv = info.get("pv") or [m for m in (played.move, played.ponder) if m is not None]
+                if played.ponder is not None:
+                    ponder_board = search_board.copy()
+                    ponder_board.push(played.move)
+                    ponder_board.push(played.ponder)
+                    self._pondering = (ponder_board, engine, time.monotonic(), None)
+            else:
+                info = engine.analyse(board, limit, game=self._game)
+                pv = info["pv"]
+            if head_start is not None:
+                self._record_ponder_saving(head_start, info, limit)
+            else:
+                # How long a search without a head start takes, for estimating ponder savings
+                self._unaided_search_time = time.monotonic() - engine_started
+
+        score = info.get("score")
+        depth = info.get("depth", limit.depth)
+        relative = score.relative if score is not None else None
+        if depth is not None:
+            self.cache.put(
+                board,
+                [move.uci() for move in pv],
+                depth,
+                score_cp=relative.score() if relative is not None and not relative.is_mate() else None,
+                score_mate=relative.mate() if relative is not None else None,
+            )
+        return SearchResult(
+            move=pv[0], pv=pv, score=score, depth=depth,
+            nodes=info.get("nodes"), nps=info.get("nps"),
+        )
+
+    def _search_streaming(self, engine, board, limit, analysis=None, started=None, on_info=None, stop=None):
+        # Follow the search as it deepens and stop as soon as the policy is satisfied;
+        # the engine limit is the hard cap
+        hard_stop = None
+        if analysis is None:
+            started = time.monotonic()
+            analysis = engine.analysis(board, limit, game=self._game)
+        elif limit.time is not None:
+            # A resumed ponder search is unbounded on the engine side, so cap it here
+            hard_stop = threading.Timer(limit.time, analysis.stop)
+            hard_stop.start()
+        try:
+            with analysis:
+                for _ in analysis:
+                    if on_info is not None:
+                        on_info(dict(analysis.info))
+                    if stop is not None and stop.is_set():
+                        break
+                    if "pv" in analysis.info and self.policy.should_stop(
+                        analysis.info, time.monotonic() - started, limit
+                    ):
+                        break
+                info = dict(analysis.info)
+        finally:
+            if hard_stop is not None:
+                hard_stop.cancel()
+        if not info.get("pv"):
+            raise ValueError("Engine returned no move")
+        return info
+
+    @contextlib.contextmanager
+    def _checkout_engine(self, prefer=None, timeout=None):
+        if self.pool is None:
+            with self._engine_lock:
+                yield self.engine
+            return
+
+        engine = self.pool.checkout(timeout=timeout, prefer=prefer, owner=self)
+        failed = False
+        try:
+            yield engine
+        except chess.engine.EngineTerminatedError:
+            failed = True
+            metrics.inc("engine_failures")
+            raise
+        finally:
+            self.pool.checkin(engine, failed=failed)
+
+    def _count_ponder(self, pondering, board):
+        """Count a hit when the ponder searched exactly `board`, the position now asked for."""
+        hit = pondering[0].epd() == board.epd()
+        if hit:
+            self.ponder_hits += 1
+        else:
+            self.ponder_misses += 1
+        metrics.inc("ponder", result="hit" if hit else "miss")
+        return hit
+
+    def _ponder_hit(self, pondering, board, engine):
+        """Return the pondered board if `engine` is still pondering exactly `board`."""
+        if pondering is None or not self._count_ponder(pondering, board):
+            return None
+        ponder_board, ponder_engine, _, _ = pondering
+        # The prediction was right, but the search can only resume on the same engine
+        still_ours = self.pool is None or self.pool.previous_owner(engine) is self
+        return ponder_board if engine is ponder_engine and still_ours else None
+
+    def _record_ponder_saving(self, head_start, info, limit):
+        # The head start only saves what the search actually needed: the engine's own
+        # search time (counted from the ponder start), else the move's time cap, else
+        # how long the last search without a head start took
+        needed = info.get("time", limit.time)
+        if needed is None:
+            needed = self._unaided_search_time
+        saved = head_start if needed is None else min(head_start, needed)
+        self.ponder_time_saved += saved
+        metrics.observe("ponder_saved_seconds", saved)
+
+    def _stop_pondering(self, pondering, board=None):
+        # Any new engine command cancels a running ponder search. With `board`, the
+        # position answered without the engine, the ponder still counts as hit or miss
+        if pondering is None:
+            return
+        if board is not None:
+            self._count_ponder(pondering, board)
+        try:
+            with self._checkout_engine(prefer=pondering[1], timeout=0) as engine:
+                if engine is pondering[1]:
+                    engine.ping()
+        except TimeoutError:
+            pass  # every engine is busy, so the ponder has already been cancelled
+
+    def new_game(self):
+        """Start a new game: the next search sends ucinewgame but keeps the process and its hash."""
+        pondering, self._pondering = self._pondering, None
+        # An abandoned game is not a missed prediction
+        self._stop_pondering(pondering)
+        self._game = object()
+        self.first_move_time = None
+
+    def is_ready(self, timeout=0):
+        """Readiness probe: warm-up finished and the engine process (or pool) is alive."""
+        if self.pool is not None:
+            return self.pool.is_ready(timeout)
+        return self._ready.wait(timeout) and engine_alive(self.engine)
+
+    def startup_stats(self):
+        return {
+            "startup_s": self.startup_time,
+            "warmup_s": self.warmup_time,
+            "first_move_s": self.first_move_time,
+            "ready": self.is_ready(),
+        }
+
+    def _warm_up(self):
+        try:
+            with self._engine_lock:
+                self.warmup_time = warm_up_engine(self.engine, game=self._game)
+            log_event(log, "engine_warmed_up", seconds=round(self.warmup_time, 2))
+        except chess.engine.EngineError as e:
+            metrics.inc("engine_warmup_failures")
+            log_event(log, "engine_warmup_failed", logging.WARNING, error=str(e))
+        finally:
+            self._ready.set()
+
+    def _book_move(self, board):
+        if self.book is None or board.ply() >= self.max_book_ply:
+            return None
+        try:
+            if self.book_policy == "best":
+                entry = self.book.find(board)
+            elif self.book_policy == "weighted":
+                entry = self.book.weighted_choice(board, random=random)
+            else:
+                entry = self.book.choice(board, random=random)
+        except IndexError:
+            return None  # out of book
+        return entry.move
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def ponder_stats(self):
+        total = self.ponder_hits + self.ponder_misses
+        return {
+            "hits": self.ponder_hits,
+            "misses": self.ponder_misses,
+            "hit_rate": self.ponder_hits / total if total else 0.0,
+            "time_saved_s": self.ponder_time_saved,
+        }
 
     def close(self):
-        self.engine.quit()
+        # A shared pool and cache outlive the predictor; only release what it owns
+        if self.engine is not None:
+            self.engine.quit()
+        if self._owns_cache:
+            self.cache.close()
+        if self.book is not None:
+            self.book.close()
+
+    @staticmethod
+    def _from_cache(board, cached):
+        pv = [chess.Move.from_uci(uci) for uci in cached["pv"]]
+        if cached["score_mate"] is not None:
+            relative = chess.engine.Mate(cached["score_mate"])
+        elif cached["score_cp"] is not None:
+            relative = chess.engine.Cp(cached["score_cp"])
+        else:
+            relative = None
+        score = chess.engine.PovScore(relative, board.turn) if relative is not None else None
+        return SearchResult(move=pv[0], pv=pv, score=score, depth=cached["depth"], source="cache")
@@ -0,0 +1,252 @@
+import concurrent.futures
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from src.utils import metrics
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("robot")
+
+# The robot link is off unless a broker is configured
+DEFAULT_HOST = os.environ.get("CHESS_MQTT_HOST")
+DEFAULT_PORT = int(os.environ.get("CHESS_MQTT_PORT", 1883))
+DEFAULT_TOPIC = os.environ.get("CHESS_MQTT_TOPIC", "chess/robot")
+DEFAULT_QOS = 1
+# Seconds to wait for the broker's PUBACK and then the robot's ack before a command is resent
+ACK_TIMEOUT = 5.0
+KEEPALIVE = 30
+
+
+def robot_link_configured():
+    return bool(DEFAULT_HOST)
+
+
+class RobotPublisher:
+    """Sends move commands to the robot arm over one long-lived MQTT connection.
+
+    `send()` only queues the command and returns a Future; a background thread
+    publishes the queue in order on `<topic>/command`. The robot answers each
+    command on `<topic>/ack` with {"id": ..., "status": "done" | "failed"}.
+    A command without a PUBACK and a robot ack within `ack_timeout` seconds is
+    published again under the same id (the robot skips ids it has executed),
+    and later commands wait behind it, so moves are neither lost nor reordered.
+    With `ack_timeout=None` the broker's PUBACK is enough. paho reconnects with
+    backoff when the broker goes away; queued commands wait until it is back.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, topic=DEFAULT_TOPIC, qos=DEFAULT_QOS,
+                 ack_timeout=ACK_TIMEOUT, max_queue=64, keepalive=KEEPALIVE, client_id=None,
+                 username=None, password=None):
+        if not host:
+            raise ValueError("No MQTT broker configured: pass host or set CHESS_MQTT_HOST")
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError as e:
+            raise RuntimeError("The robot link needs paho-mqtt: pip install paho-mqtt") from e
+
+        self.host = host
+        self.port = int(port)
+        self.command_topic = f"{topic}/command"
+        self.ack_topic = f"{topic}/ack"
+        # Retained "online"/"offline", with "offline" as the last will if we vanish
+        self.status_topic = f"{topic}/publisher"
+        self.qos = qos
+        self.ack_timeout = ack_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}  # command id -> (acked event, future, queued at)
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._session = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+
+        self.sent = 0  # publishes, including resends
+        self.acked = 0
+        self.retries = 0
+        self.reconnects = 0
+        self._has_connected = False
+
+        client_id = client_id or f"chess-{self._session}"
+        # paho 2.x asks for the callback API version; 1.x has no such argument
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self._client = mqtt.Client(client_id=client_id)
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.will_set(self.status_topic, "offline", qos=1, retain=True)
+        self._client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+
+        # connect_async + loop_start: the network thread connects, and reconnects, on its own
+        self._client.connect_async(self.host, self.port, keepalive)
+        self._client.loop_start()
+        self._thread = threading.Thread(target=self._run, name="RobotPublisher", daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    @property
+    def backlog(self):
+        """Commands queued or in flight."""
+        with self._lock:
+            return self._queue.qsize() + len(self._pending)
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def send(self, move_json):
+        """Queue a move (a `decode_uci_to_json` dict) for the robot without blocking.
+
+        Returns a Future that resolves with the robot's ack. Raises RuntimeError
+        when the publisher is closed or the queue is full.
+        """
+        if self._stop.is_set():
+            raise RuntimeError("Robot publisher is closed")
+        command = dict(move_json, id=f"{self._session}-{next(self._ids)}")
+        future = concurrent.futures.Future()
+        try:
+            self._queue.put_nowait((command, future, time.monotonic()))
+        except queue.Full:
+            metrics.inc("robot_commands", status="rejected")
+            raise RuntimeError(f"Robot command queue is full ({self._queue.maxsize} waiting)") from None
+        metrics.inc("robot_commands", status="queued")
+        return future
+
+    def close(self, timeout=5.0):
+        """Deliver what is queued for up to `timeout` seconds, then disconnect."""
+        if self._stop.is_set():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        self._stop.set()
+        self._thread.join(1.0)
+
+        undelivered = []
+        with self._lock:
+            undelivered.extend(future for _, future, _ in self._pending.values())
+            self._pending.clear()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                undelivered.append(item[1])
+        for future in undelivered:
+            future.cancel()
+        if undelivered:
+            log_event(log, "robot_commands_dropped", count=len(undelivered))
+
+        if self._connected.is_set():
+            self._client.publish(self.status_topic, "offline", qos=1, retain=True).wait_for_publish(1.0)
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # --- paho callbacks (network thread); arguments differ between paho 1.x and 2.x ---
+
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        if getattr(reason_code, "is_failure", reason_code != 0):
+            log_event(log, "robot_connect_failed", host=self.host, port=self.port, reason=str(reason_code))
+            return
+        if self._has_connected:
+            self.reconnects += 1
+            metrics.inc("robot_reconnects")
+        self._has_connected = True
+        # Subscriptions do not survive a clean session, so renew them on every connect
+        client.subscribe(self.ack_topic, qos=1)
+        client.publish(self.status_topic, "online", qos=1, retain=True)
+        self._connected.set()
+        log_event(log, "robot_connected", host=self.host, port=self.port, reconnects=self.reconnects)
+
+    def _on_disconnect(self, client, userdata, *args):
+        was_connected = self._connected.is_set()
+        self._connected.clear()
+        if was_connected and not self._stop.is_set():
+            log_event(log, "robot_disconnected", host=self.host, backlog=self.backlog)
+
+    def _on_message(self, client, userdata, message):
+        try:
+            ack = json.loads(message.payload)
+            command_id = ack["id"]
+        except (ValueError, TypeError, KeyError):
+            log_event(log, "robot_ack_invalid", payload=message.payload[:200])
+            return
+        with self._lock:
+            entry = self._pending.pop(command_id, None)
+        if entry is None:
+            return  # duplicate ack for a resent command, or not ours
+        acked, future, queued_at = entry
+        acked.set()
+        self.acked += 1
+        metrics.observe("robot_ack_seconds", time.monotonic() - queued_at)
+        if ack.get("status", "done") == "failed":
+            metrics.inc("robot_commands", status="failed")
+            future.set_exception(RuntimeError(f"Robot failed command {command_id}: {ack.get('error', 'no reason given')}"))
+        else:
+            metrics.inc("robot_commands", status="acked")
+            future.set_result(ack)
+
+    # --- sender thread ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                return
+            self._deliver(*item)
+
+    def _deliver(self, command, future, queued_at):
+        acked = threading.Event()
+        with self._lock:
+            self._pending[command["id"]] = (acked, future, queued_at)
+        payload = json.dumps(command)
+        timeout = self.ack_timeout or ACK_TIMEOUT
+        attempts = 0
+        while not self._stop.is_set():
+            if not self._connected.wait(0.5):
+                continue
+            if attempts:
+                self.retries += 1
+                metrics.inc("robot_retries")
+                log_event(log, "robot_command_resent", id=command["id"], attempt=attempts + 1)
+            attempts += 1
+            try:
+                info = self._client.publish(self.command_topic, payload, qos=self.qos)
+                info.wait_for_publish(timeout)
+                published = info.is_published()
+            except (RuntimeError, ValueError):
+                # Not connected (any more); wait for the reconnect and publish again
+                published = False
+            if not published:
+                continue
+            self.sent += 1
+            if self.ack_timeout is None:
+                with self._lock:
+                    self._pending.pop(command["id"], None)
+                metrics.inc("robot_commands", status="published")
+                future.set_result({"id": command["id"], "status": "published"})
+                return
+            if acked.wait(self.ack_timeout):
+                return
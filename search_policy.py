@@ -0,0 +1,105 @@
+import chess
+import chess.engine
+
+# Share of the nominal budget spent per game phase: book-like openings need
+# less, sharp middlegames more
+PHASE_FACTORS = {"opening": 0.5, "middlegame": 1.0, "endgame": 0.7}
+# Fraction of the remaining clock a single move may use
+CLOCK_SHARE = 1 / 30
+# Stop searching when less than this is left on the clock, whatever the policy says
+MIN_MOVE_TIME = 0.05
+
+
+def game_phase(board):
+    pieces = chess.popcount(board.occupied & ~board.pawns & ~board.kings)
+    if board.ply() < 16 and pieces >= 12:
+        return "opening"
+    if pieces <= 6:
+        return "endgame"
+    return "middlegame"
+
+
+def allocate_time(budget, board, clock=None, increment=0.0, adapt=True):
+    """Seconds to spend on this move given a nominal `budget` and the side to move's clock."""
+    seconds = budget * PHASE_FACTORS[game_phase(board)] if adapt else budget
+    if clock is not None:
+        seconds = min(seconds, clock * CLOCK_SHARE + 0.8 * increment)
+    return max(seconds, MIN_MOVE_TIME)
+
+
+class SearchPolicy:
+    """Turns a position (and optionally the remaining clock) into an engine limit.
+
+    `min_depth` is the depth a cached analysis must have to be reused instead of
+    searching. Streaming policies are searched incrementally and may stop early
+    once `should_stop` says so; the engine limit is then only the hard cap.
+    Policies keep no per-search state, so one instance can serve concurrent
+    searches: `should_stop` gets the limit that `limit` returned for the search.
+    """
+
+    min_depth = 0
+    streaming = False
+
+    def limit(self, board, clock=None, increment=0.0):
+        raise NotImplementedError
+
+    def should_stop(self, info, elapsed, limit=None):
+        return False
+
+
+class FixedDepth(SearchPolicy):
+    def __init__(self, depth=15, max_time=None):
+        self.depth = depth
+        self.min_depth = depth
+        self.max_time = max_time
+
+    def limit(self, board, clock=None, increment=0.0):
+        max_time = self.max_time
+        if clock is not None:
+            max_time = allocate_time(max_time or clock, board, clock, increment, adapt=False)
+        return chess.engine.Limit(depth=self.depth, time=max_time)
+
+
+class TimeBudget(SearchPolicy):
+    def __init__(self, seconds=1.0, adapt=True, min_depth=12):
+        self.seconds = seconds
+        self.adapt = adapt
+        self.min_depth = min_depth
+
+    def limit(self, board, clock=None, increment=0.0):
+        return chess.engine.Limit(time=allocate_time(self.seconds, board, clock, increment, self.adapt))
+
+
+class NodeBudget(SearchPolicy):
+    def __init__(self, nodes=1_000_000, min_depth=12):
+        self.nodes = nodes
+        self.min_depth = min_depth
+
+    def limit(self, board, clock=None, increment=0.0):
+        return chess.engine.Limit(nodes=self.nodes)
+
+
+class HybridPolicy(SearchPolicy):
+    """Search at least `min_depth`, stop once `target_time` has passed, never exceed `max_time`.
+
+    The best move found so far is returned when the hard cap expires, even if
+    `min_depth` was not reached.
+    """
+
+    streaming = True
+
+    def __init__(self, min_depth=10, max_time=2.0, target_time=None, adapt=True):
+        self.min_depth = min_depth
+        self.max_time = max_time
+        self.target_time = target_time if target_time is not None else max_time / 2
+        self.adapt = adapt
+
+    def limit(self, board, clock=None, increment=0.0):
+        return chess.engine.Limit(time=allocate_time(self.max_time, board, clock, increment, self.adapt))
+
+    def should_stop(self, info, elapsed, limit=None):
+        # The target shrinks with the move's hard cap (phase, clock), read back from its limit
+        target = self.target_time
+        if limit is not None and limit.time is not None:
+            target *= limit.time / self.max_time
+        return info.get("depth", 0) >= self.min_depth and elapsed >= target
@@ -0,0 +1,57 @@
+# src/libs/batch_inference.py
+
+import weakref
+
+import numpy as np
+from onnxruntime.capi.onnxruntime_pybind11_state import Fail as OrtFail
+
+# Sessions that advertise a symbolic batch dim but only run with N=1; learned on
+# the first failed batch, so later frames go straight to per-item runs
+_single_item_models = weakref.WeakKeyDictionary()
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def fixed_batch_size(model):
+    # Models exported without a dynamic axis report an int batch dimension
+    batch_dim = model.get_inputs()[0].shape[0]
+    if isinstance(batch_dim, int) and batch_dim > 0:
+        return batch_dim
+    return None
+
+
+def run_batch(model, batch):
+    """Run `model` over an NCHW batch and return its first output, one row per item."""
+    input_name = model.get_inputs()[0].name
+    chunk_size = fixed_batch_size(model)
+    if chunk_size is None and model in _single_item_models:
+        chunk_size = 1
+
+    if chunk_size is None:
+        try:
+            return model.run(None, {input_name: batch})[0]
+        except OrtFail:
+            # Some exports advertise a symbolic batch dim but were traced with N=1: a node
+            # then fails on the batch shape. Wrong input dtypes or shapes raise
+            # InvalidArgument instead and are not retried; neither is a batch that
+            # also fails as a single item.
+            if len(batch) <= 1:
+                raise
+            first = model.run(None, {input_name: batch[:1]})[0]
+            _single_item_models[model] = True
+            return np.concatenate([first, run_batch(model, batch[1:])])
+
+    outputs = []
+    for start in range(0, len(batch), chunk_size):
+        chunk = batch[start:start + chunk_size]
+        n = len(chunk)
+        if n < chunk_size:
+            # Pad the last chunk up to the fixed batch size and drop the padding after
+            pad = np.zeros((chunk_size - n,) + chunk.shape[1:], dtype=chunk.dtype)
+            chunk = np.concatenate([chunk, pad])
+        outputs.append(model.run(None, {input_name: chunk})[0][:n])
+    return np.concatenate(outputs)
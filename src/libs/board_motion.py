@@ -0,0 +1,141 @@
+# src/libs/board_motion.py
+
+import time
+
+import cv2
+import numpy as np
+
+SETTLE_TIME = 0.6  # seconds the board must stay still before it is analysed
+MOTION_THRESHOLD = 0.03  # mean abs difference of one square between frames (pixels in 0..1)
+CHANGE_THRESHOLD = 0.05  # mean abs difference of one square from the last settled board
+MAX_CHANGED_SQUARES = 6  # more changed squares than any move touches: something covers the board
+OCCLUSION_TIMEOUT = 5.0  # a board that stays "covered" this long is analysed anyway (e.g. camera bumped)
+MAX_RETRIES = 2  # failed analyses of one still board retried (with backoff) before waiting for motion
+
+
+class BoardMotionDetector:
+    """Decides when a new board position is worth running the full pipeline on.
+
+    Each frame is warped to a tiny grey board (or, before the corners are known,
+    the whole frame is downscaled) and compared per square with the previous frame
+    and with the last settled board. `update` returns True exactly once after the
+    board changed and then stayed still for `settle_time` seconds. A hand over the
+    board shows up as motion, or as too many changed squares while it rests.
+    When analysing the settled board fails, `rearm` retries it up to
+    `max_retries` times, each after a doubled settle wait, and then gives up
+    until the board moves again.
+    """
+
+    def __init__(self, settle_time=SETTLE_TIME, motion_threshold=MOTION_THRESHOLD,
+                 change_threshold=CHANGE_THRESHOLD, max_changed_squares=MAX_CHANGED_SQUARES,
+                 occlusion_timeout=OCCLUSION_TIMEOUT, max_retries=MAX_RETRIES, size=64):
+        if size % 8:
+            raise ValueError("size must be a multiple of 8")
+        self.settle_time = settle_time
+        self.motion_threshold = motion_threshold
+        self.change_threshold = change_threshold
+        self.max_changed_squares = max_changed_squares
+        self.occlusion_timeout = occlusion_timeout
+        self.max_retries = max_retries
+        self.size = size
+        self.state = "idle"  # "moving", "settling", "stable", "occluded" or "waiting" (retries used up)
+        self.triggers = 0
+        self.reset()
+
+    def reset(self, frame=None, matrix=None):
+        """Forget the history; with `frame`, take it as the settled board."""
+        self._previous = None
+        self._reference = None
+        self._last_reference = None
+        self._still_since = None
+        self._matrix_key = None
+        self._clear_retries()
+        if frame is not None:
+            self._previous = self._reference = self._small(frame, matrix)
+            self._last_reference = None
+            self._matrix_key = None if matrix is None else matrix.tobytes()
+
+    def update(self, frame, matrix=None, now=None):
+        """Feed one BGR frame; True when the board has settled in a new position.
+
+        `matrix` is the board homography for a `size` x `size` output, e.g.
+        `ChessBoard.corner_tracker.matrix(detector.size)`.
+        """
+        now = time.monotonic() if now is None else now
+        small = self._small(frame, matrix)
+        matrix_key = None if matrix is None else matrix.tobytes()
+        if self._previous is None or matrix_key != self._matrix_key:
+            # First frame, or the board was (re)located: start over from here
+            self._matrix_key = matrix_key
+            self._previous = small
+            self._reference = small
+            self._still_since = now
+            self._clear_retries()
+            self.state = "settling"
+            return False
+
+        motion = self._square_differences(small, self._previous).max()
+        self._previous = small
+        if motion > self.motion_threshold:
+            self._still_since = None
+            self._clear_retries()
+            self.state = "moving"
+            return False
+        if self._waiting_for_motion:
+            self.state = "waiting"
+            return False
+        if self._still_since is None:
+            self._still_since = now
+        still_for = now - self._still_since
+        if still_for < self.settle_time + self._retry_delay:
+            self.state = "settling"
+            return False
+
+        changed = int((self._square_differences(small, self._reference) > self.change_threshold).sum())
+        if changed == 0:
+            self.state = "stable"
+            return False
+        if changed > self.max_changed_squares and still_for < self.occlusion_timeout:
+            self.state = "occluded"
+            return False
+
+        self._last_reference = self._reference
+        self._reference = small
+        self.state = "stable"
+        self.triggers += 1
+        return True
+
+    def rearm(self):
+        """Undo the last trigger, e.g. when analysing the settled board failed.
+
+        The settled board is compared with the previous reference again, so it
+        triggers a new attempt once it has stayed still for twice as long as
+        before. After `max_retries` attempts it stays quiet until the board moves,
+        so a board no move explains does not rerun the models forever.
+        """
+        if self._last_reference is not None:
+            self._reference = self._last_reference
+            self._last_reference = None
+        self._still_since = None
+        self._retries += 1
+        if self._retries > self.max_retries:
+            self._waiting_for_motion = True
+        else:
+            self._retry_delay = self.settle_time * (2 ** self._retries - 1)
+
+    def _clear_retries(self):
+        self._retries = 0
+        self._retry_delay = 0.0
+        self._waiting_for_motion = False
+
+    def _small(self, frame, matrix):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if matrix is not None:
+            small = cv2.warpPerspective(gray, matrix, (self.size, self.size), flags=cv2.INTER_AREA)
+        else:
+            small = cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32) / 255.0
+
+    def _square_differences(self, a, b):
+        cell = self.size // 8
+        return np.abs(a - b).reshape(8, cell, 8, cell).mean(axis=(1, 3))
@@ -2,13 +2,16 @@
 
 import cv2
 import numpy as np
-import onnxruntime as ort
+
+from src.libs.batch_inference import run_batch, softmax
+from src.libs.onnx_session import create_session
 
 MODEL_PATH = "src/models/cnn_color.onnx"
 INPUT_SIZE = 64  # Adjust if your model expects another size
 
-def load_color_model():
-    return ort.InferenceSession(MODEL_PATH)
+def load_color_model(precision=None):
+    # precision="int8" picks the quantized model when published (see tools/quantize_models.py)
+    return create_session(MODEL_PATH, "color", precision=precision)
 
 def preprocess_color_image(img):
     resized = cv2.resize(img, (INPUT_SIZE, INPUT_SIZE))
@@ -25,3 +28,20 @@ def classify_color(img, model):
     class_index = int(np.argmax(logits))
     
     return "white" if class_index == 1 else "black"
+
+
+def preprocess_color_batch(imgs):
+    # Stack all square crops into a single NCHW tensor
+    resized = np.stack([cv2.resize(img, (INPUT_SIZE, INPUT_SIZE)) for img in imgs])
+    batch = resized.astype(np.float32) / 255.0
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))  # NHWC -> NCHW
+
+
+def classify_color_batch(batch, model):
+    """Classify an (N, C, H, W) batch, returning N labels and an (N, 2) probability array."""
+    if len(batch) == 0:
+        return [], np.zeros((0, 2), dtype=np.float32)
+
+    probs = softmax(run_batch(model, batch))
+    labels = ["white" if class_index == 1 else "black" for class_index in probs.argmax(axis=1)]
+    return labels, probs
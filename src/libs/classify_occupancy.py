@@ -0,0 +1,29 @@
+# src/libs/classify_occupancy.py
+
+import os
+
+import numpy as np
+
+from src.libs.batch_inference import run_batch, softmax
+from src.libs.onnx_session import create_session
+
+# Single model answering empty / white piece / black piece per square. Until a jointly
+# trained model exists, build it from cnn_piece + cnn_color with tools/fuse_classifiers.py
+MODEL_PATH = "src/models/cnn_square.onnx"
+INPUT_SIZE = 64
+LABELS = ("empty", "white", "black")
+
+def square_model_available():
+    return os.path.exists(MODEL_PATH)
+
+def load_square_model(precision=None):
+    return create_session(MODEL_PATH, "square", precision=precision)
+
+def classify_square_batch(batch, model):
+    """Classify an (N, C, H, W) batch, returning N labels and an (N, 3) [empty, white, black] array."""
+    if len(batch) == 0:
+        return [], np.zeros((0, 3), dtype=np.float32)
+
+    probs = softmax(run_batch(model, batch))
+    labels = [LABELS[class_index] for class_index in probs.argmax(axis=1)]
+    return labels, probs
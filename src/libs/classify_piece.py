@@ -2,13 +2,16 @@
 
 import cv2
 import numpy as np
-import onnxruntime as ort
+
+from src.libs.batch_inference import run_batch, softmax
+from src.libs.onnx_session import create_session
 
 MODEL_PATH = "src/models/cnn_piece.onnx"
 INPUT_SIZE = 64  # adapt if model expects a different size
 
-def load_piece_model():
-    return ort.InferenceSession(MODEL_PATH)
+def load_piece_model(precision=None):
+    # precision="int8" picks the quantized model when published (see tools/quantize_models.py)
+    return create_session(MODEL_PATH, "piece", precision=precision)
 
 def preprocess_piece_image(img):
     resized = cv2.resize(img, (INPUT_SIZE, INPUT_SIZE))
@@ -26,3 +29,13 @@ def classify_piece(img, model):
     class_index = int(np.argmax(logits))
     
     return "piece" if class_index == 1 else "empty"
+
+
+def classify_piece_batch(batch, model):
+    """Classify an (N, C, H, W) batch, returning N labels and an (N, 2) probability array."""
+    if len(batch) == 0:
+        return [], np.zeros((0, 2), dtype=np.float32)
+
+    probs = softmax(run_batch(model, batch))
+    labels = ["piece" if class_index == 1 else "empty" for class_index in probs.argmax(axis=1)]
+    return labels, probs
@@ -1,8 +1,14 @@
-def split_board_into_squares(board_img, grid_size=8):
+import numpy as np
+
+
+def split_board_into_squares(board_img, grid_size=8, as_tensor=False):
     h, w = board_img.shape[:2]
     square_h = h // grid_size
     square_w = w // grid_size
 
+    if as_tensor:
+        return board_to_tensor(board_img[:square_h * grid_size, :square_w * grid_size], grid_size)
+
     squares = []
     for row in range(grid_size):
         for col in range(grid_size):
@@ -17,3 +23,36 @@ def split_board_into_squares(board_img, grid_size=8):
                 "image": square_img
             })
     return squares
+
+
+def board_to_tensor(board_img, grid_size=8):
+    """Slice a warped board into a normalized (grid_size**2, C, H, W) float32 tensor.
+
+    Squares are ordered row-major, so index i is (i // grid_size, i % grid_size).
+    """
+    h, w, c = board_img.shape
+    square_h = h // grid_size
+    square_w = w // grid_size
+
+    # (row, H, col, W, C) -> (row, col, C, H, W) as a strided view, no copy yet
+    tiles = board_img.reshape(grid_size, square_h, grid_size, square_w, c)
+    tiles = tiles.transpose(0, 2, 4, 1, 3)
+
+    # Normalizing materializes the view once as a contiguous float tensor
+    tensor = tiles.astype(np.float32, order="C")
+    tensor /= 255.0
+    return tensor.reshape(grid_size * grid_size, c, square_h, square_w)
+
+
+def square_thumbnails(tensor, size=16):
+    """Downsample a (N, C, H, W) square tensor to (N, size, size) grey thumbnails by block averaging."""
+    n, c, h, w = tensor.shape
+    fy, fx = max(h // size, 1), max(w // size, 1)
+    th, tw = h // fy, w // fx
+    blocks = tensor[:, :, :th * fy, :tw * fx].reshape(n, c, th, fy, tw, fx)
+    return blocks.mean(axis=(1, 3, 5))
+
+
+def square_change_scores(previous, current):
+    """Mean absolute difference per square between two thumbnail stacks."""
+    return np.abs(current - previous).mean(axis=(1, 2))
@@ -2,13 +2,18 @@
 
 import cv2
 import numpy as np
-import onnxruntime as ort
+
+from src.libs.onnx_session import create_session
 
 MODEL_PATH = "src/models/yolo_corner.onnx"
 INPUT_SIZE = 640  # standard YOLO size
+CONF_THRESHOLD = 0.3
+NMS_IOU_THRESHOLD = 0.5
+MIN_CORNER_SEPARATION = 0.05  # fraction of the image diagonal
 
-def load_model():
-    return ort.InferenceSession(MODEL_PATH)
+def load_model(precision=None):
+    # precision="int8" picks the quantized model when published (see tools/quantize_models.py)
+    return create_session(MODEL_PATH, "corner", precision=precision)
 
 def preprocess(image):
     original_shape = image.shape[:2]  # (H, W)
@@ -17,50 +22,101 @@ def preprocess(image):
     return np.expand_dims(img, axis=0), original_shape
 
 
-def postprocess(outputs, original_shape):
-    pred = outputs[0]
-    pred = pred.T  # YOLO output
-    boxes = []
-    for det in pred:
-        conf = float(det[4])
-        if conf < 0.3:
-            continue
-        x, y, w, h = det[0:4]
+def postprocess(outputs, original_shape, conf_threshold=CONF_THRESHOLD, return_scores=False):
+    """Turn raw YOLO output into up to 4 ordered corner centres.
+
+    With `return_scores` the per-corner confidences are returned alongside,
+    in the same top-left, top-right, bottom-right, bottom-left order.
+    """
+    pred = np.asarray(outputs[0])
+    if pred.ndim == 3:
+        pred = pred[0]
+    pred = pred.T  # YOLO output: one row per anchor, [x, y, w, h, class scores...]
+
+    scores = pred[:, 4:].max(axis=1)
+    keep = scores >= conf_threshold
+    pred, scores = pred[keep], scores[keep]
+
+    # These are normalized wrt 640x640, so map back to original image
+    h, w = original_shape
+    xywh = pred[:, :4] * np.array([w, h, w, h], dtype=np.float32) / INPUT_SIZE
+    boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+
+    keep = non_max_suppression(boxes, scores)
+    centres, scores = select_corners(xywh[keep, :2], scores[keep], np.hypot(h, w) * MIN_CORNER_SEPARATION)
+
+    if len(centres) == 4:
+        order = order_point_indices(centres)
+        centres, scores = centres[order], scores[order]
+    if return_scores:
+        return centres, scores
+    return centres
+
+
+def non_max_suppression(boxes, scores, iou_threshold=NMS_IOU_THRESHOLD):
+    """Class-agnostic NMS over (N, 4) x1y1x2y2 boxes. Returns kept indices by descending score."""
+    order = np.argsort(-scores)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
 
-        # These are normalized wrt 640x640, so map back to original image
-        x *= original_shape[1] / INPUT_SIZE
-        y *= original_shape[0] / INPUT_SIZE
-        w *= original_shape[1] / INPUT_SIZE
-        h *= original_shape[0] / INPUT_SIZE
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
 
-        x1 = int(x - w / 2)
-        y1 = int(y - h / 2)
-        x2 = int(x + w / 2)
-        y2 = int(y + h / 2)
-        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-        boxes.append((cx, cy))
-    return order_points(boxes)
+
+def select_corners(centres, scores, min_distance, count=4):
+    """Greedily pick the `count` most confident centres that are at least `min_distance` apart."""
+    chosen = []
+    for i in np.argsort(-scores):
+        if all(np.hypot(*(centres[i] - centres[j])) >= min_distance for j in chosen):
+            chosen.append(i)
+            if len(chosen) == count:
+                break
+    chosen = np.array(chosen, dtype=np.int64)
+    return centres[chosen], scores[chosen]
+
+
+def order_point_indices(points):
+    """ Index order of 4 points as top-left, top-right, bottom-right, bottom-left """
+    points = np.asarray(points)
+    s = points.sum(axis=1)
+    diff = np.diff(points, axis=1)[:, 0]
+    order = np.array([np.argmin(s), np.argmin(diff), np.argmax(s), np.argmax(diff)])
+
+    if len(set(order.tolist())) < 4:
+        # Strongly rotated boards make the sum/diff rule collide; sort by angle instead
+        centre = points.mean(axis=0)
+        angles = np.arctan2(points[:, 1] - centre[1], points[:, 0] - centre[0])
+        order = np.argsort(angles)  # clockwise in image coordinates, starting near top-left
+        start = np.argmin(s[order])
+        order = np.roll(order, -start)
+    return order
 
 
 def order_points(points):
     """ Orders 4 points as top-left, top-right, bottom-right, bottom-left """
     points = np.array(points)
-    s = points.sum(axis=1)
-    diff = np.diff(points, axis=1)
-    
-    # divide all the points by 100 so they are in scale
-    # points = points / 1000.0
-
-    return np.array([
-        points[np.argmin(s)],    # top-left
-        points[np.argmin(diff)], # top-right
-        points[np.argmax(s)],    # bottom-right
-        points[np.argmax(diff)], # bottom-left
-    ])
-
-def detect_corners(image, model):
+    return points[order_point_indices(points)]
+
+def detect_corners(image, model, min_confidence=None, return_scores=False):
     inp, shape = preprocess(image)
     ort_inputs = {model.get_inputs()[0].name: inp}
     ort_outs = model.run(None, ort_inputs)
-    corners = postprocess(ort_outs, shape)
+    corners, scores = postprocess(ort_outs, shape, return_scores=True)
+
+    # Drop weak corners so callers fail fast instead of warping a bad quad
+    if min_confidence is not None:
+        strong = scores >= min_confidence
+        corners, scores = corners[strong], scores[strong]
+    if return_scores:
+        return corners, scores
     return corners
@@ -0,0 +1,84 @@
+# src/libs/model_registry.py
+
+import threading
+
+from src.libs.detect_board import load_model
+from src.libs.classify_piece import INPUT_SIZE as PIECE_INPUT_SIZE, load_piece_model
+from src.libs.classify_color import load_color_model
+from src.libs.classify_occupancy import (
+    INPUT_SIZE as SQUARE_INPUT_SIZE,
+    load_square_model,
+    square_model_available,
+)
+
+# name -> zero-argument loader returning an InferenceSession
+_loaders = {
+    "corner": load_model,
+    "piece": load_piece_model,
+    "color": load_color_model,
+    "square": load_square_model,
+}
+_models = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register_model(name, loader):
+    """Register (or replace) the loader for `name`; a loaded session is dropped."""
+    with _registry_lock:
+        _loaders[name] = loader
+        _models.pop(name, None)
+
+
+def get_model(name):
+    """Process-wide shared session for `name`, loaded on first use.
+
+    ONNX Runtime sessions are safe to `run` from several threads, so every
+    ChessBoard shares them instead of loading its own copy from disk.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        if name not in _loaders:
+            raise KeyError(f"No model registered under {name!r}")
+        lock = _locks.setdefault(name, threading.Lock())
+
+    # Per-model lock: loading one model does not block lookups of the others
+    with lock:
+        model = _models.get(name)
+        if model is None:
+            model = _loaders[name]()
+            _models[name] = model
+    return model
+
+
+def fused_model_available():
+    """True when the one empty/white/black "square" model can replace the piece -> colour cascade."""
+    return square_model_available() and SQUARE_INPUT_SIZE == PIECE_INPUT_SIZE
+
+
+def preload_models(names=None, fused=None):
+    """Load every registered model (or just `names`) up front, e.g. at server start.
+
+    Without `names`, only the classifiers a ChessBoard will run are loaded: the
+    fused "square" model when it is in use (`fused=None`: when its file exists),
+    otherwise the separate "piece" and "color" models.
+    """
+    if names is None:
+        if fused is None:
+            fused = fused_model_available()
+        skipped = {"piece", "color"} if fused else {"square"}
+        names = [name for name in _loaders if name not in skipped]
+    for name in names:
+        get_model(name)
+
+
+def loaded_models():
+    return sorted(_models)
+
+
+def clear_models():
+    with _registry_lock:
+        _models.clear()
@@ -0,0 +1,170 @@
+# src/libs/onnx_session.py
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import platform
+
+import onnxruntime as ort
+
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("onnx")
+
+# Per-model settings are merged in this order: DEFAULT_SESSION_CONFIG, the "default"
+# and then the model's section of the JSON config file, then environment variables
+# CHESS_ORT_<KEY> and CHESS_ORT_<MODEL>_<KEY> (e.g. CHESS_ORT_PIECE_INTRA_OP_THREADS=2).
+CONFIG_PATH = os.environ.get("CHESS_ORT_CONFIG", "src/models/ort_config.json")
+CACHE_DIR = os.environ.get("CHESS_ORT_CACHE_DIR", "src/models/.ort_cache")
+
+DEFAULT_SESSION_CONFIG = {
+    "intra_op_threads": 0,  # 0 lets ONNX Runtime pick
+    "inter_op_threads": 0,
+    "execution_mode": "sequential",  # or "parallel"
+    "graph_optimization_level": "all",  # "disable", "basic", "extended" or "all"
+    "intra_op_thread_affinities": "",  # e.g. "1;2" to pin the intra-op threads to cores
+    "cache_optimized_model": True,
+    "precision": "fp32",  # "int8" selects <model>.int8.onnx when it has been published
+}
+
+_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def session_config(name, **overrides):
+    config = dict(DEFAULT_SESSION_CONFIG)
+    if os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH) as f:
+            file_config = json.load(f)
+        config.update(file_config.get("default", {}))
+        config.update(file_config.get(name, {}))
+
+    for key, default in DEFAULT_SESSION_CONFIG.items():
+        for env_name in (f"CHESS_ORT_{key.upper()}", f"CHESS_ORT_{name.upper()}_{key.upper()}"):
+            if env_name in os.environ:
+                config[key] = _parse_env(os.environ[env_name], default)
+
+    config.update(overrides)
+    return config
+
+
+def session_options(config):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = int(config["intra_op_threads"])
+    options.inter_op_num_threads = int(config["inter_op_threads"])
+    options.execution_mode = _EXECUTION_MODES[config["execution_mode"]]
+    options.graph_optimization_level = _OPTIMIZATION_LEVELS[config["graph_optimization_level"]]
+    if config["intra_op_thread_affinities"]:
+        options.add_session_config_entry(
+            "session.intra_op_thread_affinities", config["intra_op_thread_affinities"]
+        )
+    return options
+
+
+def optimized_model_path(model_path, config):
+    """Cache file for the optimized graph of `model_path` at the configured level.
+
+    The key covers the model's full path and content, so a same-named model in
+    another directory, or a replacement copied with an old mtime, never loads
+    another graph. Optimized graphs can also contain kernels picked for the CPU's
+    instruction set (AVX2 vs AVX-512, ...) and the ONNX Runtime version, so the
+    CPU feature flags and the version are part of the key too.
+    """
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    level = config["graph_optimization_level"]
+    key = hashlib.sha256()
+    key.update(os.path.abspath(model_path).encode())
+    key.update(_file_digest(model_path).encode())
+    key.update(f"{ort.__version__}|{_cpu_fingerprint()}".encode())
+    return os.path.join(CACHE_DIR, f"{stem}.{level}.{key.hexdigest()[:16]}.onnx")
+
+
+def quantized_model_path(model_path, precision="int8"):
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{precision}{ext}"
+
+
+def resolve_model_path(model_path, precision):
+    """The variant of `model_path` for `precision`, falling back to the float model."""
+    if precision in (None, "fp32"):
+        return model_path
+    variant = quantized_model_path(model_path, precision)
+    if not os.path.exists(variant):
+        log_event(log, "model_variant_missing", logging.WARNING, model=model_path, precision=precision)
+        return model_path
+    if os.path.getmtime(variant) < os.path.getmtime(model_path):
+        # The float model was replaced after the variant was made from it
+        log_event(log, "model_variant_stale", logging.WARNING, model=model_path, variant=variant)
+        return model_path
+    return variant
+
+
+def create_session(model_path, name, **overrides):
+    """Create an InferenceSession for `model_path` using the settings for model `name`.
+
+    The optimized graph is saved on the first start and loaded on later starts
+    (with optimization switched off), until the source model's content changes.
+    """
+    config = session_config(name, **{k: v for k, v in overrides.items() if v is not None})
+    model_path = resolve_model_path(model_path, config["precision"])
+    options = session_options(config)
+    providers = ["CPUExecutionProvider"]
+
+    if not config["cache_optimized_model"] or config["graph_optimization_level"] == "disable":
+        return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+
+    cached_path = optimized_model_path(model_path, config)
+    if os.path.exists(cached_path):
+        cached_options = session_options(dict(config, graph_optimization_level="disable"))
+        try:
+            return ort.InferenceSession(cached_path, sess_options=cached_options, providers=providers)
+        except Exception as e:
+            log_event(log, "optimized_model_unreadable", logging.WARNING, path=cached_path, error=str(e))
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        options.optimized_model_filepath = cached_path
+    except OSError as e:
+        log_event(log, "optimized_model_not_cached", logging.WARNING, model=name, error=str(e))
+    return ort.InferenceSession(model_path, sess_options=options, providers=providers)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _cpu_fingerprint():
+    # /proc/cpuinfo lists the instruction set extensions on Linux; elsewhere the
+    # processor string is the best cheap approximation
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = " ".join(sorted(line.split(":", 1)[1].split()))
+                    return f"{platform.machine()}|{hashlib.sha256(flags.encode()).hexdigest()[:16]}"
+    except OSError:
+        pass
+    return f"{platform.machine()}|{platform.processor()}"
+
+
+def _parse_env(value, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    return value
@@ -0,0 +1,111 @@
+# src/libs/track_board.py
+
+import cv2
+import numpy as np
+
+from src.libs.detect_board import detect_corners
+from src.libs.warp_board import get_warp_matrix
+
+PATCH_RADIUS = 16     # half-size of the template cut around each corner
+SEARCH_RADIUS = 8     # how far (px) a corner may have moved and still be found
+MIN_CORRELATION = 0.8
+MAX_DRIFT = 3.0       # px; beyond this the cached corners are considered stale
+
+
+class CornerTracker:
+    """Caches board corners and homographies between frames.
+
+    On a rigidly mounted camera the board does not move, so instead of running
+    YOLO on every frame we check that the image patches around the cached
+    corners still match. YOLO only runs when that check fails or the corners
+    drifted by more than `max_drift` pixels.
+    """
+
+    def __init__(self, model, min_confidence=None, patch_radius=PATCH_RADIUS,
+                 search_radius=SEARCH_RADIUS, min_correlation=MIN_CORRELATION, max_drift=MAX_DRIFT):
+        self.model = model
+        self.min_confidence = min_confidence
+        self.patch_radius = patch_radius
+        self.search_radius = search_radius
+        self.min_correlation = min_correlation
+        self.max_drift = max_drift
+        self.hits = 0
+        self.misses = 0
+        self.reset()
+
+    def reset(self):
+        self.corners = None
+        self.scores = None
+        self._frame_shape = None
+        self._templates = []
+        self._matrices = {}
+
+    def locate(self, image):
+        """Return (corners, scores) for `image`, reusing the cached corners when still valid."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        if self.corners is not None and self._still_valid(gray):
+            self.hits += 1
+            return self.corners, self.scores
+
+        self.misses += 1
+        corners, scores = detect_corners(
+            image, self.model, min_confidence=self.min_confidence, return_scores=True
+        )
+        # Keep the old calibration when detection fails, e.g. a hand covering a corner
+        if len(corners) == 4:
+            self._update(gray, corners, scores)
+        return corners, scores
+
+    def matrix(self, output_size):
+        """Homography from the cached corners to an output_size x output_size board."""
+        if self.corners is None:
+            return None
+        if output_size not in self._matrices:
+            self._matrices[output_size] = get_warp_matrix(self.corners, output_size)
+        return self._matrices[output_size]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _update(self, gray, corners, scores):
+        self.corners = np.asarray(corners, dtype=np.float32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self._frame_shape = gray.shape
+        self._matrices = {}
+        self._templates = []
+        for x, y in self.corners:
+            x0, y0, x1, y1 = self._window(gray.shape, x, y, self.patch_radius)
+            self._templates.append((x0, y0, gray[y0:y1, x0:x1].copy()))
+
+    def _still_valid(self, gray):
+        if gray.shape != self._frame_shape:
+            return False
+
+        r = self.search_radius
+        for x0, y0, template in self._templates:
+            th, tw = template.shape
+            if th == 0 or tw == 0:
+                return False
+            sx0, sy0 = max(x0 - r, 0), max(y0 - r, 0)
+            search = gray[sy0:y0 + th + r, sx0:x0 + tw + r]
+            if search.shape[0] < th or search.shape[1] < tw:
+                return False
+
+            response = cv2.matchTemplate(search, template, cv2.TM_CCOEFF_NORMED)
+            _, best, _, (bx, by) = cv2.minMaxLoc(response)
+            drift = np.hypot(sx0 + bx - x0, sy0 + by - y0)
+            if not best >= self.min_correlation or drift > self.max_drift:
+                return False
+        return True
+
+    @staticmethod
+    def _window(shape, x, y, radius):
+        h, w = shape[:2]
+        x, y = int(round(x)), int(round(y))
+        return max(x - radius, 0), max(y - radius, 0), min(x + radius, w), min(y + radius, h)
@@ -1,8 +1,8 @@
 import cv2
 import numpy as np
 
-def warp_board(image, corners, output_size=800):
-    # Destination points for a top-down 800x800 view
+def get_warp_matrix(corners, output_size=800):
+    # Destination points for a top-down output_size x output_size view
     dst_pts = np.array([
         [0, 0],
         [output_size - 1, 0],
@@ -13,7 +13,17 @@ def warp_board(image, corners, output_size=800):
     src_pts = np.array(corners, dtype=np.float32)
 
     # Compute the perspective transform matrix
-    matrix = cv2.getPerspectiveTransform(src_pts, dst_pts)
+    return cv2.getPerspectiveTransform(src_pts, dst_pts)
+
+def warp_board(image, corners, output_size=800, square_size=None, matrix=None):
+    # Warp straight to classifier resolution when a per-square size is given,
+    # so the squares never have to be resized again
+    if square_size is not None:
+        output_size = 8 * square_size
+
+    # A cached homography (see CornerTracker) skips recomputing the transform
+    if matrix is None:
+        matrix = get_warp_matrix(corners, output_size)
 
     # Warp the image
     warped = cv2.warpPerspective(image, matrix, (output_size, output_size))
@@ -0,0 +1,67 @@
+# src/utils/debug_writer.py
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+import cv2
+
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("debug")
+
+
+class DebugWriter:
+    """Writes debug artifacts (board dumps, captured frames) from a background thread.
+
+    Each writer gets its own session directory under `root`, so concurrent
+    sessions never overwrite each other's files. Writes are queued and never
+    block the caller; when the queue is full the artifact is dropped.
+    """
+
+    def __init__(self, root, max_pending=64):
+        self.directory = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="DebugWriter", daemon=True)
+        self._thread.start()
+
+    def write_text(self, name, text):
+        self._submit(name, text)
+
+    def write_board(self, name, board_matrix):
+        self._submit(name, "".join(" ".join(row) + "\n" for row in board_matrix))
+
+    def write_image(self, name, image):
+        self._submit(name, image)
+
+    def close(self, timeout=5.0):
+        """Flush pending writes and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _submit(self, name, payload):
+        try:
+            self._queue.put_nowait((name, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, payload = item
+            path = os.path.join(self.directory, name)
+            try:
+                if isinstance(payload, str):
+                    with open(path, "w") as f:
+                        f.write(payload)
+                else:
+                    cv2.imwrite(path, payload)
+            except Exception as e:
+                log_event(log, "debug_write_failed", logging.WARNING, path=path, error=str(e))
@@ -0,0 +1,19 @@
+# src/utils/image_utils.py
+
+import glob
+import os
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def is_image_path(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_images(directory, limit=None):
+    """Image files under `directory` (recursively), sorted by path; at most `limit` of them."""
+    paths = sorted(
+        p for p in glob.glob(os.path.join(directory, "**", "*"), recursive=True)
+        if is_image_path(p)
+    )
+    return paths[:limit] if limit else paths
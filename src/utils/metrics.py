@@ -0,0 +1,252 @@
+# src/utils/metrics.py
+
+import bisect
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metrics are off unless CHESS_METRICS=1 (or CHESS_METRICS_PORT) is set or enable() is
+# called. While off, span() hands back a shared no-op context and inc()/observe() return
+# after one flag check, so the instrumented hot paths cost next to nothing.
+METRICS_ENV = "CHESS_METRICS"
+PORT_ENV = "CHESS_METRICS_PORT"
+LOG_FORMAT_ENV = "CHESS_LOG_FORMAT"  # "text" (default) or "json"
+LOG_LEVEL_ENV = "CHESS_LOG_LEVEL"
+PREFIX = "chess_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum
+_server = None
+_NOOP = contextlib.nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(port=None, host="127.0.0.1"):
+    """Start recording; with `port`, also serve Prometheus text on http://host:port/metrics."""
+    global _enabled
+    _enabled = True
+    if port is not None:
+        start_http_server(port, host)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    """Add `value` to counter `name` (exported as chess_<name>_total)."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record `value` (seconds, or any unit matching DEFAULT_BUCKETS) in histogram `name`."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    index = bisect.bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0]
+        histogram[0][index] += 1
+        histogram[1] += value
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            inc(f"{self.name}_errors", **self.labels)
+        return False
+
+
+def span(name, **labels):
+    """Time a block into histogram `name` (seconds); failures also count `<name>_errors`."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, labels)
+
+
+def snapshot():
+    """Current values as plain dicts, e.g. for a status page or a benchmark report."""
+    with _lock:
+        counters = {_series(PREFIX + name + "_total", labels): value for (name, labels), value in _counters.items()}
+        histograms = {
+            _series(PREFIX + name, labels): {"count": sum(counts), "sum": total}
+            for (name, labels), (counts, total) in _histograms.items()
+        }
+    return {"counters": counters, "histograms": histograms}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name, labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(counts), total)) for key, (counts, total) in _histograms.items())
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric = PREFIX + name + "_total"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{_series(metric, labels)} {value}")
+    for (name, labels), (counts, total) in histograms:
+        metric = PREFIX + name
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(DEFAULT_BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{_series(metric + '_bucket', labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{_series(metric + '_sum', labels)} {total}")
+        lines.append(f"{_series(metric + '_count', labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would otherwise flood stderr
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; a second call is a no-op. Returns the bound port."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="MetricsServer", daemon=True).start()
+        return _server.server_address[1]
+
+
+def stop_http_server():
+    global _server
+    with _lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+# --- structured logging ---
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and the event's fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """`event key=value ...`, close to the print output it replaces."""
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        line = " ".join([record.getMessage()] + [f"{k}={v}" for k, v in fields.items()])
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(fmt=None, level=None, stream=None):
+    """(Re)install the handler for every `chess.*` logger."""
+    fmt = fmt or os.environ.get(LOG_FORMAT_ENV, "text")
+    level = level or os.environ.get(LOG_LEVEL_ENV, "INFO")
+    root = logging.getLogger("chess")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+
+
+def get_logger(name):
+    root = logging.getLogger("chess")
+    if not root.handlers:
+        configure_logging()
+    return logging.getLogger(f"chess.{name}")
+
+
+def log_event(logger, event, level=logging.INFO, exc_info=None, **fields):
+    """Log `event` with structured `fields` (rendered as JSON keys or key=value pairs)."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+
+if os.environ.get(METRICS_ENV, "").lower() in ("1", "true", "yes") or os.environ.get(PORT_ENV):
+    try:
+        enable(port=os.environ.get(PORT_ENV) or None)
+    except OSError as e:
+        enable()
+        get_logger("metrics").warning(f"Metrics endpoint not started: {e}")
@@ -0,0 +1,95 @@
+"""RobotPublisher against the in-process fake broker and robot (tools/fake_mqtt_broker.py)."""
+
+import json
+import time
+
+import pytest
+
+pytest.importorskip("paho.mqtt.client")
+
+from robot_link import RobotPublisher  # noqa: E402
+from tools.fake_mqtt_broker import FakeBroker, FakeRobot  # noqa: E402
+
+TOPIC = "test/robot"
+TIMEOUT = 10.0
+
+
+def _move(n):
+    return {"move": f"move-{n}", "steps": []}
+
+
+def _wait_for(condition, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def broker():
+    with FakeBroker() as broker:
+        yield broker
+
+
+@pytest.fixture
+def robot(broker):
+    return FakeRobot(broker, TOPIC)
+
+
+@pytest.fixture
+def publisher(broker):
+    publisher = RobotPublisher(broker.host, broker.port, topic=TOPIC, ack_timeout=0.5)
+    assert publisher.wait_connected(TIMEOUT)
+    # The retained "online" status is the publisher's first publish; let it land first
+    _wait_for(lambda: any(topic == publisher.status_topic for topic, _, _ in broker.messages))
+    yield publisher
+    publisher.close(timeout=1.0)
+
+
+def test_order_holds_across_reconnect(broker, robot, publisher):
+    robot.move_seconds = 0.05
+    futures = [publisher.send(dict(_move(n), steps=[{}])) for n in range(6)]
+    _wait_for(lambda: len(robot.commands) >= 2)
+    broker.drop_clients()
+
+    for future in futures:
+        assert future.result(TIMEOUT)["status"] == "done"
+    assert [c["move"] for c in robot.commands] == [f"move-{n}" for n in range(6)]
+    _wait_for(lambda: publisher.reconnects >= 1)
+
+
+def test_lost_publish_is_resent(broker, robot, publisher):
+    broker.lose_publishes = 1
+    future = publisher.send(_move(0))
+
+    assert future.result(TIMEOUT)["status"] == "done"
+    assert publisher.retries >= 1
+    assert [c["move"] for c in robot.commands] == ["move-0"]
+
+
+def test_duplicates_are_dropped(broker, robot, publisher):
+    # The first ack is lost, so the command is resent under the same id
+    robot.silent = True
+    future = publisher.send(_move(0))
+    _wait_for(lambda: robot.received >= 1)
+    robot.silent = False
+
+    ack = future.result(TIMEOUT)
+    assert robot.received >= 2
+    assert len(robot.commands) == 1
+    # A late duplicate ack for a finished command is ignored
+    broker.publish(f"{TOPIC}/ack", json.dumps(ack), qos=1)
+    second = publisher.send(_move(1))
+    assert second.result(TIMEOUT)["status"] == "done"
+    assert publisher.acked == 2
+    assert [c["move"] for c in robot.commands] == ["move-0", "move-1"]
+
+
+def test_failure_ack_fails_the_future(robot, publisher):
+    robot.fail = True
+    future = publisher.send(_move(0))
+
+    with pytest.raises(RuntimeError, match="gripper fault"):
+        future.result(TIMEOUT)
+    assert publisher.backlog == 0
@@ -0,0 +1,303 @@
+"""End-to-end pipeline benchmark with per-stage latency percentiles.
+
+Drives every stage between PLAY and the robot command over a corpus of stored
+frames (a directory of images, a single image or a video):
+
+    capture -> detect_corners -> warp_board -> split_board_into_squares
+    -> classify -> detect_move -> predict_best_move -> decode_uci_to_json
+
+and reports p50/p95/p99 per stage, throughput and peak RSS. Results can be
+written as JSON and compared against a previous run to catch regressions
+between commits.
+
+With --synthetic no trained models or Stockfish are needed: tiny stand-in
+models (tools/synthetic_models.py) and a fake UCI engine
+(tools/fake_uci_engine.py) are used instead, so it runs on offline CI machines.
+
+Run from the repository root:
+
+    python -m tools.benchmark_pipeline --frames captures/game1 --output bench.json
+    python -m tools.benchmark_pipeline --synthetic --compare bench.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from src.libs.classify_piece import INPUT_SIZE as PIECE_INPUT_SIZE
+from src.libs.classify_squares import split_board_into_squares
+from src.libs.detect_board import detect_corners
+from src.libs.model_registry import get_model, register_model
+from src.libs.onnx_session import create_session
+from src.libs.warp_board import warp_board
+from src.utils.image_utils import is_image_path, list_images
+
+STAGES = (
+    "capture",
+    "detect_corners",
+    "warp_board",
+    "split_board_into_squares",
+    "classify",
+    "detect_move",
+    "predict_best_move",
+    "decode_uci_to_json",
+)
+PERCENTILES = (50, 95, 99)
+FAKE_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+
+
+def iter_frames(source):
+    """Yield decoded BGR frames from an image directory, an image file or a video."""
+    if os.path.isdir(source):
+        for path in list_images(source):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame
+    elif is_image_path(source):
+        frame = cv2.imread(source)
+        if frame is None:
+            raise ValueError(f"Cannot read image {source}")
+        yield frame
+    else:
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video {source}")
+        try:
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            capture.release()
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    summary = {"count": len(samples), "mean_ms": float(ms.mean()), "max_ms": float(ms.max())}
+    for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f"p{p}_ms"] = float(value)
+    return summary
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def use_synthetic_models(directory):
+    """Point the model registry at freshly written stand-in models."""
+    from tools.synthetic_models import write_synthetic_models
+
+    for name, path in write_synthetic_models(directory).items():
+        register_model(name, lambda path=path, name=name: create_session(path, name, cache_optimized_model=False))
+
+
+def create_predictor(args):
+    from position_cache import PositionCache
+    from predictor import ChessMovePredictor
+
+    if args.synthetic and not args.engine:
+        engine = [sys.executable, FAKE_ENGINE, "--depth-ms", str(args.fake_depth_ms)]
+    else:
+        engine = args.engine
+    # Book and cache would turn repeated positions into lookups; measure the search itself
+    predictor = ChessMovePredictor(
+        stockfish_path=engine, depth=args.depth, book_path=None,
+        cache=PositionCache(None, max_memory_entries=0),
+    )
+    predictor.is_ready(timeout=60)
+    return predictor
+
+
+def run(args, frames):
+    from utils import ChessBoard, decode_uci_to_json
+
+    # Full refresh on every frame: the corpus is not a continuous stream, and
+    # the classifiers should be timed over all 64 squares
+    # (the stand-in models have no fused square classifier)
+    board = ChessBoard(full_refresh_interval=1, fused=False if args.synthetic else None)
+    corner_model = get_model("corner")
+    predictor = None if args.no_engine else create_predictor(args)
+
+    samples = {stage: [] for stage in STAGES + ("total",)}
+    failures = {"no_corners": 0, "no_move": 0, "errors": 0}
+    measured = 0
+    started = None
+
+    try:
+        for index in range(args.warmup + args.repeat * len(frames)):
+            warm = index < args.warmup
+            if not warm and started is None:
+                started = time.perf_counter()
+            timings = {}
+            frame_started = last = time.perf_counter()
+
+            def lap(stage):
+                nonlocal last
+                now = time.perf_counter()
+                timings[stage] = now - last
+                last = now
+
+            try:
+                # "capture": decode the stored frame (re-encoded from memory)
+                image = cv2.imdecode(frames[index % len(frames)], cv2.IMREAD_COLOR)
+                lap("capture")
+
+                corners = detect_corners(image, corner_model)
+                lap("detect_corners")
+                if len(corners) != 4:
+                    failures["no_corners"] += 0 if warm else 1
+                    continue
+
+                warped = warp_board(image, corners, square_size=PIECE_INPUT_SIZE)
+                lap("warp_board")
+
+                piece_batch = split_board_into_squares(warped, as_tensor=True)
+                lap("split_board_into_squares")
+
+                board._classify_squares(piece_batch, warped)
+                lap("classify")
+
+                board._detect_move(board._square_probs)
+                lap("detect_move")
+
+                if predictor is not None:
+                    fen = board.chess_board.fen()
+                    move = predictor.predict_best_move(fen)
+                    lap("predict_best_move")
+                    if move is None:
+                        failures["no_move"] += 0 if warm else 1
+                    else:
+                        decode_uci_to_json(fen, move.uci())
+                        lap("decode_uci_to_json")
+            except Exception as e:
+                if not warm:
+                    failures["errors"] += 1
+                print(f"Frame {index % len(frames)} failed: {e}")
+                continue
+
+            if not warm:
+                measured += 1
+                timings["total"] = time.perf_counter() - frame_started
+                for stage, duration in timings.items():
+                    samples[stage].append(duration)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+    finally:
+        if predictor is not None:
+            predictor.close()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "synthetic": args.synthetic,
+            "frames": len(frames),
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "depth": None if args.no_engine else args.depth,
+            "fused_classifier": board.square_model is not None,
+        },
+        "stages": {stage: summarize(values) for stage, values in samples.items() if values},
+        "measured_frames": measured,
+        "throughput_fps": measured / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "failures": failures,
+    }
+
+
+def print_report(report):
+    print(f"{'stage':<26}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, summary in report["stages"].items():
+        print(f"{stage:<26}{summary['count']:>7}{summary['p50_ms']:>10.2f}"
+              f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+    print(f"throughput: {report['throughput_fps']:.2f} frames/s, peak RSS: {report['peak_rss_mb']:.1f} MB")
+    if any(report["failures"].values()):
+        print(f"failures: {report['failures']}")
+
+
+def compare(report, baseline, metric="p95_ms"):
+    """Relative change of `metric` per stage against a baseline report (+0.10 = 10% slower)."""
+    changes = {}
+    for stage, summary in report["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {}).get(metric)
+        if before:
+            changes[stage] = summary[metric] / before - 1.0
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", default="chess_board_capture.jpeg",
+                        help="Image directory, image file or video to replay")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use stand-in models, synthetic frames (unless --frames is given) and a fake engine")
+    parser.add_argument("--engine", help="UCI engine path (default: the configured Stockfish)")
+    parser.add_argument("--no-engine", action="store_true", help="Benchmark the vision stages only")
+    parser.add_argument("--depth", type=int, default=15)
+    parser.add_argument("--fake-depth-ms", type=float, default=2.0, help="Per-depth delay of the fake engine")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=3, help="Frames run before measuring")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float,
+                        help="With --compare, exit non-zero if any stage's p95 grows by more than this fraction")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.synthetic:
+            use_synthetic_models(workdir)
+        if args.synthetic and args.frames == parser.get_default("frames"):
+            from tools.synthetic_models import synthetic_frame
+            decoded = [synthetic_frame(seed=i) for i in range(8)]
+        else:
+            decoded = list(iter_frames(args.frames))
+        if not decoded:
+            raise SystemExit(f"No frames found in {args.frames}")
+        # Keep frames encoded in memory so disk speed does not skew "capture"
+        frames = [cv2.imencode(".png", frame)[1] for frame in decoded]
+        del decoded
+
+        report = run(args, frames)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            changes = compare(report, json.load(f))
+        for stage, change in changes.items():
+            print(f"{stage:<26}{change:>+9.1%}")
+        regressed = [s for s, c in changes.items() if args.max_regression is not None and c > args.max_regression]
+        if regressed:
+            raise SystemExit(f"p95 regression above {args.max_regression:.0%} in: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
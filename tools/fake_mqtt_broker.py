@@ -0,0 +1,336 @@
+"""Minimal in-process MQTT 3.1.1 broker, with an optional stand-in robot, for checking the robot link.
+
+It speaks enough of the protocol for paho (CONNECT with last will, PUBLISH at
+QoS 0/1 with PUBACK, SUBSCRIBE with + and # filters, retained messages, PING,
+DISCONNECT) over real TCP on localhost. Hooks make the unhappy paths easy to
+produce: `drop_clients()` cuts every connection as a broker restart would, and
+`lose_publishes` swallows the next N incoming publishes without a PUBACK.
+
+With --robot, or `FakeRobot(broker)`, every command on <topic>/command is
+acknowledged on <topic>/ack the way the arm's controller does.
+
+    python -m tools.fake_mqtt_broker --port 1883 --robot chess/robot
+"""
+
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(levels) or (level != "+" and level != levels[i]):
+            return False
+    return len(filter_levels) == len(levels)
+
+
+def _packet(kind, flags, body):
+    header = bytearray([kind << 4 | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + body
+
+
+def _string(data, offset):
+    (length,) = struct.unpack_from("!H", data, offset)
+    return data[offset + 2:offset + 2 + length], offset + 2 + length
+
+
+class _Connection(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.broker = self.server.broker
+        self.client_id = None
+        self.will = None
+        self.subscriptions = {}  # filter -> granted QoS
+        self.send_lock = threading.Lock()
+        self.next_packet_id = 0
+
+    def send(self, data):
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def publish(self, topic, payload, qos, retain=False):
+        body = struct.pack("!H", len(topic)) + topic.encode()
+        if qos:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            body += struct.pack("!H", self.next_packet_id)
+        try:
+            self.send(_packet(PUBLISH, qos << 1 | int(retain), body + payload))
+        except OSError:
+            pass  # the reader side notices and cleans up
+
+    def read_exact(self, count):
+        data = b""
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+    def read_packet(self):
+        first = self.read_exact(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self.read_exact(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first >> 4, first & 0x0F, self.read_exact(length) if length else b""
+
+    def handle(self):
+        clean = False
+        try:
+            while True:
+                kind, flags, body = self.read_packet()
+                if kind == CONNECT:
+                    self.on_connect(body)
+                elif kind == PUBLISH:
+                    self.on_publish(flags, body)
+                elif kind == SUBSCRIBE:
+                    self.on_subscribe(body)
+                elif kind == UNSUBSCRIBE:
+                    (packet_id,) = struct.unpack_from("!H", body)
+                    offset = 2
+                    while offset < len(body):
+                        topic_filter, offset = _string(body, offset)
+                        self.subscriptions.pop(topic_filter.decode(), None)
+                    self.send(_packet(UNSUBACK, 0, struct.pack("!H", packet_id)))
+                elif kind == PINGREQ:
+                    self.send(_packet(PINGRESP, 0, b""))
+                elif kind == DISCONNECT:
+                    clean = True
+                    return
+                # PUBACKs for our QoS 1 deliveries need no bookkeeping here
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.broker._detach(self, clean)
+
+    def on_connect(self, body):
+        _, offset = _string(body, 0)  # protocol name
+        connect_flags = body[offset + 1]
+        offset += 4  # level, flags, keepalive
+        client_id, offset = _string(body, offset)
+        self.client_id = client_id.decode()
+        if connect_flags & 0x04:
+            will_topic, offset = _string(body, offset)
+            will_payload, offset = _string(body, offset)
+            self.will = (will_topic.decode(), will_payload, (connect_flags >> 3) & 0x03, bool(connect_flags & 0x20))
+        self.broker._attach(self)
+        self.send(_packet(CONNACK, 0, b"\x00\x00"))
+
+    def on_publish(self, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic, offset = _string(body, 0)
+        packet_id = None
+        if qos:
+            (packet_id,) = struct.unpack_from("!H", body, offset)
+            offset += 2
+        if self.broker._lose_publish():
+            return
+        self.broker.publish(topic.decode(), body[offset:], qos, bool(flags & 0x01))
+        if qos:
+            self.send(_packet(PUBACK, 0, struct.pack("!H", packet_id)))
+
+    def on_subscribe(self, body):
+        (packet_id,) = struct.unpack_from("!H", body)
+        offset, granted, filters = 2, [], []
+        while offset < len(body):
+            topic_filter, offset = _string(body, offset)
+            qos = min(body[offset], 1)
+            offset += 1
+            self.subscriptions[topic_filter.decode()] = qos
+            granted.append(qos)
+            filters.append(topic_filter.decode())
+        self.send(_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted)))
+        for topic, (payload, qos) in self.broker.retained_messages():
+            for topic_filter in filters:
+                if topic_matches(topic_filter, topic):
+                    self.publish(topic, payload, min(qos, self.subscriptions[topic_filter]), retain=True)
+                    break
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeBroker:
+    """A broker on localhost; `port=0` picks a free port (see `.port`)."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._server = _Server((host, port), _Connection)
+        self._server.broker = self
+        self.host, self.port = self._server.server_address[:2]
+        self._lock = threading.Lock()
+        self._connections = []
+        self._retained = {}
+        self._hooks = []
+        self.lose_publishes = 0
+        self.messages = []  # (topic, payload, qos) of every accepted publish
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeBroker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_clients()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def drop_clients(self):
+        """Cut every client connection without a DISCONNECT, as a broker restart would."""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def add_hook(self, topic_filter, callback):
+        """Call `callback(topic, payload)` for every publish matching `topic_filter`."""
+        self._hooks.append((topic_filter, callback))
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._lock:
+            self.messages.append((topic, payload, qos))
+            if retain:
+                if payload:
+                    self._retained[topic] = (payload, qos)
+                else:
+                    self._retained.pop(topic, None)
+            connections = list(self._connections)
+        for connection in connections:
+            granted = [q for f, q in list(connection.subscriptions.items()) if topic_matches(f, topic)]
+            if granted:
+                connection.publish(topic, payload, min(qos, max(granted)))
+        for topic_filter, callback in self._hooks:
+            if topic_matches(topic_filter, topic):
+                callback(topic, payload)
+
+    def retained_messages(self):
+        with self._lock:
+            return list(self._retained.items())
+
+    def _lose_publish(self):
+        with self._lock:
+            if self.lose_publishes > 0:
+                self.lose_publishes -= 1
+                return True
+            return False
+
+    def _attach(self, connection):
+        with self._lock:
+            # A client id connecting again takes over the old session
+            stale = [c for c in self._connections if c.client_id == connection.client_id]
+            self._connections.append(connection)
+        for old in stale:
+            try:
+                old.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _detach(self, connection, clean):
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.remove(connection)
+        if connection.will and not clean:
+            topic, payload, qos, retain = connection.will
+            self.publish(topic, payload, qos, retain)
+
+
+class FakeRobot:
+    """Acknowledges robot commands like the arm's controller: once per command id.
+
+    `commands` keeps every distinct command it executed, in order; resends of an
+    id it has already seen are acknowledged again but not executed twice.
+    Setting `silent` stops all acks, `fail` makes them report failure.
+    """
+
+    def __init__(self, broker, topic="chess/robot", move_seconds=0.0):
+        self.broker = broker
+        self.ack_topic = f"{topic}/ack"
+        self.move_seconds = move_seconds
+        self.commands = []
+        self.received = 0
+        self.silent = False
+        self.fail = False
+        self._seen = set()
+        # Commands are executed off the broker's connection threads, one at a time
+        self._inbox = queue.Queue()
+        threading.Thread(target=self._run, name="FakeRobot", daemon=True).start()
+        broker.add_hook(f"{topic}/command", lambda topic, payload: self._inbox.put(payload))
+
+    def _run(self):
+        while True:
+            self._execute(self._inbox.get())
+
+    def _execute(self, payload):
+        command = json.loads(payload)
+        self.received += 1
+        if command["id"] not in self._seen:
+            self._seen.add(command["id"])
+            self.commands.append(command)
+            time.sleep(self.move_seconds * len(command.get("steps", [])))
+        if self.silent:
+            return
+        ack = {"id": command["id"], "status": "failed" if self.fail else "done"}
+        if self.fail:
+            ack["error"] = "gripper fault"
+        self.broker.publish(self.ack_topic, json.dumps(ack), qos=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--robot", metavar="TOPIC", help="Also acknowledge commands under this topic prefix")
+    args = parser.parse_args()
+
+    broker = FakeBroker(args.host, args.port).start()
+    if args.robot:
+        FakeRobot(broker, args.robot)
+        broker.add_hook(f"{args.robot}/command", lambda topic, payload: print(payload.decode(), flush=True))
+    print(f"Listening on {broker.host}:{broker.port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
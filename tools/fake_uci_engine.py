@@ -0,0 +1,137 @@
+"""Minimal UCI engine for benchmarks and CI machines without Stockfish.
+
+It always plays the alphabetically first legal move and "searches" by sleeping
+--depth-ms per depth, so timings are stable and the protocol paths (go depth /
+movetime / nodes / infinite / ponder, ponderhit, stop) behave like a real engine.
+
+    python tools/fake_uci_engine.py [--depth-ms 2]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import chess
+
+OPTIONS = (
+    "option name Hash type spin default 16 min 1 max 4096",
+    "option name Threads type spin default 1 min 1 max 256",
+    "option name Ponder type check default false",
+    "option name Move Overhead type spin default 10 min 0 max 5000",
+)
+
+
+class FakeEngine:
+    def __init__(self, depth_ms):
+        self.depth_ms = depth_ms
+        self.board = chess.Board()
+        self.stop = threading.Event()
+        self.pondering = threading.Event()
+        self.worker = None
+
+    def send(self, line):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def principal_variation(self):
+        pv, board = [], self.board.copy()
+        for _ in range(2):
+            moves = sorted(board.legal_moves, key=lambda m: m.uci())
+            if not moves:
+                break
+            pv.append(moves[0])
+            board.push(moves[0])
+        return pv
+
+    def search(self, depth=None, movetime=None, nodes=None):
+        started = time.monotonic()
+        pv = self.principal_variation()
+        current = 0
+        while not self.stop.is_set():
+            current += 1
+            time.sleep(self.depth_ms / 1000)
+            elapsed = time.monotonic() - started
+            self.send(
+                f"info depth {current} score cp {current} nodes {current * 1000} "
+                f"nps {int(current * 1000 / max(elapsed, 1e-6))} time {int(elapsed * 1000)} "
+                f"pv {' '.join(m.uci() for m in pv)}"
+            )
+            if ((depth and current >= depth) or (movetime and elapsed * 1000 >= movetime)
+                    or (nodes and current * 1000 >= nodes)):
+                break
+        # A ponder or infinite search only reports its move once told to
+        while self.pondering.is_set() and not self.stop.is_set():
+            time.sleep(0.001)
+        if not pv:
+            self.send("bestmove (none)")
+        else:
+            self.send(f"bestmove {pv[0].uci()}" + (f" ponder {pv[1].uci()}" if len(pv) > 1 else ""))
+
+    def position(self, tokens):
+        if tokens[0] == "startpos":
+            board, rest = chess.Board(), tokens[1:]
+        else:
+            end = tokens.index("moves") if "moves" in tokens else len(tokens)
+            board, rest = chess.Board(" ".join(tokens[1:end])), tokens[end:]
+        for move in rest[1:]:
+            board.push_uci(move)
+        self.board = board
+
+    def go(self, tokens):
+        def value(name):
+            return int(tokens[tokens.index(name) + 1]) if name in tokens else None
+
+        self.stop.clear()
+        if "ponder" in tokens or "infinite" in tokens:
+            self.pondering.set()
+        else:
+            self.pondering.clear()
+        limits = {"depth": value("depth"), "movetime": value("movetime"), "nodes": value("nodes")}
+        self.worker = threading.Thread(target=self.search, kwargs=limits, daemon=True)
+        self.worker.start()
+
+    def halt(self):
+        self.pondering.clear()
+        self.stop.set()
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def run(self):
+        for line in sys.stdin:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if command == "uci":
+                self.send("id name FakeEngine")
+                for option in OPTIONS:
+                    self.send(option)
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "ucinewgame":
+                self.board = chess.Board()
+            elif command == "position":
+                self.position(tokens[1:])
+            elif command == "go":
+                self.go(tokens[1:])
+            elif command == "ponderhit":
+                self.pondering.clear()
+            elif command == "stop":
+                self.halt()
+            elif command == "quit":
+                self.halt()
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth-ms", type=float, default=2.0, help="Simulated time per search depth")
+    args = parser.parse_args()
+    FakeEngine(args.depth_ms).run()
+
+
+if __name__ == "__main__":
+    main()
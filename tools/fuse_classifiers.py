@@ -0,0 +1,117 @@
+"""Compose cnn_piece.onnx and cnn_color.onnx into one empty/white/black classifier.
+
+Both networks read the same preprocessed input inside a single graph, and their
+softmaxes are combined into
+
+    [P(empty), P(piece) * P(white), P(piece) * P(black)]
+
+The graph outputs the log of these probabilities. A softmax over them gives the
+probabilities back, so the result can be consumed like a jointly trained model
+emitting logits (see src/libs/classify_occupancy.py).
+
+Run from the repository root:
+
+    python -m tools.fuse_classifiers [--output src/models/cnn_square.onnx]
+"""
+
+import argparse
+
+import numpy as np
+import onnx
+from onnx import compose, helper, numpy_helper
+
+from src.libs import classify_color, classify_occupancy, classify_piece
+
+EPSILON = 1e-12  # keeps log() finite when a softmax saturates
+
+
+def _prefixed(model, prefix):
+    model = compose.add_prefix(model, prefix)
+    graph = model.graph
+    initializer_names = {init.name for init in graph.initializer}
+    inputs = [i for i in graph.input if i.name not in initializer_names]
+    if len(inputs) != 1 or len(graph.output) < 1:
+        raise ValueError(f"Expected a single-input classifier, got inputs {[i.name for i in inputs]}")
+    return model, inputs[0], graph.output[0].name
+
+
+def _merged_opsets(*models):
+    versions = {}
+    for model in models:
+        for opset in model.opset_import:
+            versions[opset.domain] = max(versions.get(opset.domain, 0), opset.version)
+    return [helper.make_opsetid(domain, version) for domain, version in versions.items()]
+
+
+def fuse(piece_path, color_path):
+    piece, piece_input, piece_logits = _prefixed(onnx.load(piece_path), "piece/")
+    color, color_input, color_logits = _prefixed(onnx.load(color_path), "color/")
+
+    piece_shape = [d.dim_value or d.dim_param for d in piece_input.type.tensor_type.shape.dim]
+    color_shape = [d.dim_value or d.dim_param for d in color_input.type.tensor_type.shape.dim]
+    if piece_shape[1:] != color_shape[1:]:
+        raise ValueError(f"Input shapes differ ({piece_shape} vs {color_shape}); cannot share one input")
+
+    # Shared input feeds both sub-graphs
+    fused_input = helper.make_tensor_value_info(
+        "input", piece_input.type.tensor_type.elem_type, piece_shape
+    )
+    nodes = [
+        helper.make_node("Identity", ["input"], [piece_input.name]),
+        helper.make_node("Identity", ["input"], [color_input.name]),
+    ]
+    nodes += list(piece.graph.node) + list(color.graph.node)
+
+    constants = [
+        numpy_helper.from_array(np.array([0], dtype=np.int64), "fuse/zero"),
+        numpy_helper.from_array(np.array([1], dtype=np.int64), "fuse/one"),
+        numpy_helper.from_array(np.array([2], dtype=np.int64), "fuse/two"),
+        numpy_helper.from_array(np.array([EPSILON], dtype=np.float32), "fuse/epsilon"),
+    ]
+    nodes += [
+        helper.make_node("Flatten", [piece_logits], ["fuse/piece_logits"], axis=1),
+        helper.make_node("Flatten", [color_logits], ["fuse/color_logits"], axis=1),
+        helper.make_node("Softmax", ["fuse/piece_logits"], ["fuse/piece_probs"], axis=1),
+        helper.make_node("Softmax", ["fuse/color_logits"], ["fuse/color_probs"], axis=1),
+        # columns: piece = [empty, piece], color = [black, white]
+        helper.make_node("Slice", ["fuse/piece_probs", "fuse/zero", "fuse/one", "fuse/one"], ["fuse/p_empty"]),
+        helper.make_node("Slice", ["fuse/piece_probs", "fuse/one", "fuse/two", "fuse/one"], ["fuse/p_piece"]),
+        helper.make_node("Slice", ["fuse/color_probs", "fuse/zero", "fuse/one", "fuse/one"], ["fuse/p_black"]),
+        helper.make_node("Slice", ["fuse/color_probs", "fuse/one", "fuse/two", "fuse/one"], ["fuse/p_white"]),
+        helper.make_node("Mul", ["fuse/p_piece", "fuse/p_white"], ["fuse/white"]),
+        helper.make_node("Mul", ["fuse/p_piece", "fuse/p_black"], ["fuse/black"]),
+        helper.make_node("Concat", ["fuse/p_empty", "fuse/white", "fuse/black"], ["fuse/probs"], axis=1),
+        helper.make_node("Add", ["fuse/probs", "fuse/epsilon"], ["fuse/probs_safe"]),
+        helper.make_node("Log", ["fuse/probs_safe"], ["logits"]),
+    ]
+
+    output = helper.make_tensor_value_info(
+        "logits", piece_input.type.tensor_type.elem_type, [piece_shape[0], len(classify_occupancy.LABELS)]
+    )
+    graph = helper.make_graph(
+        nodes, "cnn_square", [fused_input], [output],
+        initializer=list(piece.graph.initializer) + list(color.graph.initializer) + constants,
+        value_info=list(piece.graph.value_info) + list(color.graph.value_info),
+    )
+    opsets = _merged_opsets(piece, color)
+    if not any(o.domain in ("", "ai.onnx") and o.version >= 13 for o in opsets):
+        raise ValueError("Fusion needs ONNX opset >= 13 models (Slice/Softmax semantics)")
+    model = helper.make_model(graph, opset_imports=opsets, producer_name="fuse_classifiers")
+    model.ir_version = max(piece.ir_version, color.ir_version)
+    onnx.checker.check_model(model)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--piece", default=classify_piece.MODEL_PATH)
+    parser.add_argument("--color", default=classify_color.MODEL_PATH)
+    parser.add_argument("--output", default=classify_occupancy.MODEL_PATH)
+    args = parser.parse_args()
+
+    onnx.save(fuse(args.piece, args.color), args.output)
+    print(f"Fused {args.piece} + {args.color} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Produce INT8 variants of the vision models and publish them only if they stay accurate.
+
+For each model, dynamic and static (QDQ, calibrated) quantization are tried. Each candidate
+is compared with the float model on a held-out set: label agreement for the square
+classifiers, corner agreement for the YOLO corner model. The best candidate above
+--min-agreement that is also faster than the float model by more than --min-speedup is
+written next to the float model as <model>.int8.onnx, together with a JSON report. Loaders pick it up with precision="int8" or CHESS_ORT_<MODEL>_PRECISION=int8.
+
+Run from the repository root:
+
+    python -m tools.quantize_models --calibration captures/calib --holdout captures/holdout
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+from src.libs import classify_color, classify_occupancy, classify_piece, detect_board
+from src.libs.batch_inference import fixed_batch_size, run_batch
+from src.libs.classify_squares import split_board_into_squares
+from src.libs.onnx_session import quantized_model_path
+from src.libs.warp_board import warp_board
+from src.utils.image_utils import list_images
+
+CLASSIFIERS = {"piece": classify_piece, "color": classify_color, "square": classify_occupancy}
+CORNER_TOLERANCE = 0.01  # fraction of the image diagonal
+
+
+def load_square_tensors(paths, input_size):
+    """(N, C, H, W) classifier inputs from square crops or full board frames.
+
+    Images that are not much larger than a square are taken as single squares;
+    anything bigger is treated as a camera frame and split into 64 squares using
+    the float corner model.
+    """
+    squares, boards = [], []
+    corner_model = None
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        if max(image.shape[:2]) <= 2 * input_size:
+            squares.append(cv2.resize(image, (input_size, input_size)))
+            continue
+        if corner_model is None:
+            corner_model = ort.InferenceSession(detect_board.MODEL_PATH, providers=["CPUExecutionProvider"])
+        corners = detect_board.detect_corners(image, corner_model)
+        if len(corners) != 4:
+            continue
+        warped = warp_board(image, corners, square_size=input_size)
+        boards.append(split_board_into_squares(warped, as_tensor=True))
+
+    tensors = boards
+    if squares:
+        tensors.append(np.ascontiguousarray(
+            (np.stack(squares).astype(np.float32) / 255.0).transpose(0, 3, 1, 2)
+        ))
+    if not tensors:
+        raise ValueError("No usable calibration images")
+    return np.concatenate(tensors)
+
+
+def load_frame_tensors(paths):
+    frames = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is not None:
+            tensor, shape = detect_board.preprocess(image)
+            frames.append((tensor, shape))
+    if not frames:
+        raise ValueError("No usable frames")
+    return frames
+
+
+class BatchReader(CalibrationDataReader):
+    def __init__(self, input_name, batches):
+        self.input_name = input_name
+        self._batches = iter(batches)
+
+    def get_next(self):
+        batch = next(self._batches, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def calibration_batches(model_path, tensors, batch_size=32):
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    size = fixed_batch_size(session) or batch_size
+    name = session.get_inputs()[0].name
+    usable = len(tensors) - len(tensors) % size
+    return name, [tensors[i:i + size] for i in range(0, usable, size)]
+
+
+def quantize_candidates(model_path, calibration_inputs, workdir):
+    candidates = {}
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+
+    dynamic_path = os.path.join(workdir, f"{stem}.dynamic.onnx")
+    quantize_dynamic(model_path, dynamic_path, weight_type=QuantType.QInt8)
+    candidates["dynamic"] = dynamic_path
+
+    input_name, batches = calibration_inputs
+    static_path = os.path.join(workdir, f"{stem}.static.onnx")
+    quantize_static(
+        model_path, static_path, BatchReader(input_name, batches),
+        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8, per_channel=True,
+    )
+    candidates["static"] = static_path
+    return candidates
+
+
+def timed_outputs(session, inputs):
+    run_batch(session, inputs[0])  # warm-up, so allocation is not timed
+    started = time.perf_counter()
+    outputs = [run_batch(session, batch) for batch in inputs]
+    return outputs, (time.perf_counter() - started) * 1000 / len(inputs)
+
+
+def classifier_agreement(float_outputs, quant_outputs):
+    float_labels = np.concatenate(float_outputs).argmax(axis=1)
+    quant_labels = np.concatenate(quant_outputs).argmax(axis=1)
+    return float(np.mean(float_labels == quant_labels))
+
+
+def corner_agreement(float_outputs, quant_outputs, shapes):
+    agree, total = 0, 0
+    for float_out, quant_out, shape in zip(float_outputs, quant_outputs, shapes):
+        expected = detect_board.postprocess([float_out], shape)
+        if len(expected) != 4:
+            continue
+        total += 1
+        found = detect_board.postprocess([quant_out], shape)
+        tolerance = np.hypot(*shape) * CORNER_TOLERANCE
+        if len(found) == 4 and np.all(np.hypot(*(found - expected).T) <= tolerance):
+            agree += 1
+    return agree / total if total else 0.0
+
+
+def evaluate(name, model_path, candidate_path, holdout):
+    options = ort.SessionOptions()
+    float_session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    quant_session = ort.InferenceSession(candidate_path, options, providers=["CPUExecutionProvider"])
+
+    if name == "corner":
+        inputs = [tensor for tensor, _ in holdout]
+        shapes = [shape for _, shape in holdout]
+    else:
+        inputs = [holdout[i:i + 64] for i in range(0, len(holdout), 64)]
+
+    float_outputs, float_ms = timed_outputs(float_session, inputs)
+    quant_outputs, quant_ms = timed_outputs(quant_session, inputs)
+    if name == "corner":
+        agreement = corner_agreement(float_outputs, quant_outputs, shapes)
+    else:
+        agreement = classifier_agreement(float_outputs, quant_outputs)
+    return {
+        "agreement": agreement,
+        "float_ms_per_batch": float_ms,
+        "int8_ms_per_batch": quant_ms,
+        "speedup": float_ms / quant_ms if quant_ms else None,
+        "float_mb": os.path.getsize(model_path) / 1e6,
+        "int8_mb": os.path.getsize(candidate_path) / 1e6,
+    }
+
+
+def quantize_model(name, args):
+    module = detect_board if name == "corner" else CLASSIFIERS[name]
+    model_path = module.MODEL_PATH
+    calibration_paths = list_images(args.calibration, args.max_images)
+    holdout_paths = list_images(args.holdout, args.max_images)
+
+    if name == "corner":
+        calibration = np.concatenate([t for t, _ in load_frame_tensors(calibration_paths)])
+        holdout = load_frame_tensors(holdout_paths)
+    else:
+        calibration = load_square_tensors(calibration_paths, module.INPUT_SIZE)
+        holdout = load_square_tensors(holdout_paths, module.INPUT_SIZE)
+
+    report = {
+        "model": model_path, "min_agreement": args.min_agreement, "min_speedup": args.min_speedup,
+        "candidates": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        batch_size = 8 if name == "corner" else 32  # full 640x640 frames are large
+        candidates = quantize_candidates(
+            model_path, calibration_batches(model_path, calibration, batch_size), workdir
+        )
+        for method, path in candidates.items():
+            report["candidates"][method] = evaluate(name, model_path, path, holdout)
+            print(f"{name}/{method}: {report['candidates'][method]}")
+
+        passing = []
+        for method, result in report["candidates"].items():
+            # A variant slower than the float model would make precision="int8" a regression
+            if result["agreement"] < args.min_agreement:
+                result["rejected"] = f"agreement {result['agreement']:.3f} < {args.min_agreement:.3f}"
+            elif (result["speedup"] or 0.0) <= args.min_speedup:
+                result["rejected"] = f"speedup {result['speedup'] or 0.0:.2f}x <= {args.min_speedup:.2f}x"
+            else:
+                passing.append((result["agreement"], -result["int8_ms_per_batch"], method))
+                continue
+            print(f"{name}/{method}: rejected, {result['rejected']}")
+        output_path = quantized_model_path(model_path)
+        if not passing:
+            report["published"] = None
+            print(f"{name}: no INT8 candidate passed the accuracy and speed gates, not publishing")
+            if os.path.exists(output_path) and not args.dry_run:
+                # A variant from an earlier run no longer reflects this float model
+                os.remove(output_path)
+                report["removed_stale"] = output_path
+                print(f"{name}: removed stale INT8 model {output_path}")
+        elif args.dry_run:
+            report["published"] = None
+            print(f"{name}: {max(passing)[2]} would be published (dry run)")
+        else:
+            method = max(passing)[2]
+            shutil.copyfile(candidates[method], output_path)
+            report["published"] = {"method": method, "path": output_path}
+            print(f"{name}: published {method} INT8 model to {output_path}")
+
+    with open(os.path.splitext(output_path)[0] + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=["piece", "color", "corner"],
+                        choices=["piece", "color", "square", "corner"])
+    parser.add_argument("--calibration", required=True, help="directory of captured frames or square crops")
+    parser.add_argument("--holdout", required=True, help="held-out directory used for the accuracy gate")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="minimum agreement with the float model required to publish")
+    parser.add_argument("--min-speedup", type=float, default=1.0,
+                        help="publish only if the INT8 model is faster than float by more than this factor")
+    parser.add_argument("--max-images", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="evaluate without publishing")
+    args = parser.parse_args()
+
+    for name in args.models:
+        quantize_model(name, args)
+
+
+if __name__ == "__main__":
+    main()
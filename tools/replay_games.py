@@ -0,0 +1,244 @@
+"""Reconstruct games from recorded frames: a directory of images or a video in, FENs and PGN out.
+
+The vision pipeline (corner detection, warp, square classification) runs across a
+process pool, each worker with its own ONNX sessions loaded once. Workers get
+contiguous runs of frames and decode them themselves, streaming from disk, so
+neither the main process nor any worker holds the whole recording. The per-frame
+board observations come back in order and the game is rebuilt sequentially in
+the main process with ChessBoard.apply_board_state.
+
+A position is only accepted after it has been seen on --settle consecutive
+sampled frames, which filters out hands over the board and single misreads.
+
+Run from the repository root:
+
+    python -m tools.replay_games recordings/game1.mp4 --step 10 --fens game1.tsv --pgn game1.pgn
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess.pgn
+import cv2
+
+from src.utils.image_utils import list_images
+from src.utils.metrics import configure_logging
+
+_board = None  # per-worker ChessBoard holding that worker's sessions
+
+
+def _init_worker(ort_threads):
+    global _board
+    # Workers share the CPU; keep each session's thread pool to its share
+    os.environ["CHESS_ORT_INTRA_OP_THREADS"] = str(ort_threads)
+    os.environ["CHESS_ORT_INTER_OP_THREADS"] = "1"
+    from utils import ChessBoard
+
+    _board = ChessBoard()
+
+
+def _observe(index, frame):
+    try:
+        grid = _board.read_board_state(frame)
+        return index, grid, _board._square_probs.copy(), None
+    except ValueError as e:
+        return index, None, None, str(e)
+
+
+def process_chunk(task):
+    """Observe one contiguous run of frames.
+
+    Returns [(frame index, 8x8 grid or None, (64, 3) square probabilities, error)].
+    """
+    # Frames within a chunk are consecutive, so corner tracking and the
+    # incremental square cache apply; nothing carries over between chunks
+    _board.corner_tracker.reset()
+    _board._clear_square_cache()
+
+    kind, source, start, stop, step = task
+    observations = []
+    if kind == "images":
+        # `source` holds just this chunk's sampled paths
+        for index, path in zip(range(start, stop, step), source):
+            frame = cv2.imread(path)
+            if frame is None:
+                observations.append((index, None, None, f"Cannot read {path}"))
+            else:
+                observations.append(_observe(index, frame))
+        return observations
+
+    for index, capture in video_frames(source, start, stop, step):
+        ret, frame = capture.retrieve()
+        if ret:
+            observations.append(_observe(index, frame))
+    return observations
+
+
+def video_frames(source, start, stop, step=1):
+    """Yield (index, capture) for every `step`th frame in [start, stop) of a video.
+
+    Each frame has been grabbed but not decoded; call `capture.retrieve()` for it.
+    CAP_PROP_POS_FRAMES seeks land on a nearby keyframe with most codecs, so the
+    frame actually reached is identified by its timestamp: frames before `start`
+    are skipped, and when the seek overshot `start` the video is stepped through
+    from the first frame instead. Chunk boundaries then neither repeat nor drop
+    frames, and indices are the true frame numbers.
+    """
+    capture = cv2.VideoCapture(source)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        locate = start > 0 and fps > 0
+        if locate:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = -1
+        while stop is None or index + 1 < stop:
+            # Skipped frames are grabbed but never converted to images
+            if not capture.grab():
+                break
+            if locate:
+                locate = False
+                index = round(capture.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000)
+                if index > start:
+                    capture.release()
+                    capture = cv2.VideoCapture(source)
+                    index = -1
+                    continue
+            else:
+                index += 1
+            if index >= start and (index - start) % step == 0:
+                yield index, capture
+    finally:
+        capture.release()
+
+
+def chunk_tasks(source, chunk_size, step):
+    """Split the recording into tasks of `chunk_size` sampled frames; returns (tasks, fps)."""
+    span = chunk_size * step
+    if os.path.isdir(source):
+        paths = list_images(source)
+        if not paths:
+            raise ValueError(f"No images found in {source}")
+        tasks = []
+        for start in range(0, len(paths), span):
+            stop = min(start + span, len(paths))
+            tasks.append(("images", paths[start:stop:step], start, stop, step))
+        return tasks, None
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {source}")
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or None
+    capture.release()
+
+    if frame_count <= 0:
+        # Unknown length: a single task reads to the end
+        return [("video", source, 0, None, step)], fps
+    starts = list(range(0, frame_count, span))
+    # The container's frame count can be off; the last task reads until the stream ends
+    tasks = [("video", source, start, start + span, step) for start in starts[:-1]]
+    tasks.append(("video", source, starts[-1], None, step))
+    return tasks, fps
+
+
+def reconstruct(board, observations, settle):
+    """Replay ordered (index, grid, probs, error) observations onto `board` (a ChessBoard).
+
+    Yields (frame index, move uci or None, fen, error) for every accepted position
+    change; the game is left in `board.chess_board`.
+    """
+    candidate, seen, applied = None, 0, None
+    for index, grid, probs, error in observations:
+        if grid is None:
+            candidate, seen = None, 0
+            continue
+        if grid == candidate:
+            seen += 1
+        else:
+            candidate, seen = grid, 1
+        if seen != settle or grid == applied:
+            continue
+
+        applied = grid
+        moves_before = len(board.chess_board.move_stack)
+        try:
+            fen = board.apply_board_state(grid, probs)
+        except ValueError as e:
+            yield index, None, board.chess_board.fen(), str(e)
+            continue
+        if len(board.chess_board.move_stack) > moves_before:
+            yield index, board.chess_board.peek().uci(), fen, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Directory of frames (sorted by name) or a video file")
+    parser.add_argument("--fens", help="Write 'frame<TAB>seconds<TAB>move<TAB>fen' lines here (default: stdout)")
+    parser.add_argument("--pgn", help="Write the reconstructed game here (default: stdout)")
+    parser.add_argument("--step", type=int, default=1, help="Analyse every Nth frame")
+    parser.add_argument("--settle", type=int, default=3,
+                        help="Sampled frames a position must persist before it is accepted")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=64, help="Sampled frames per worker task")
+    args = parser.parse_args()
+
+    if args.step < 1 or args.settle < 1:
+        parser.error("--step and --settle must be at least 1")
+
+    # Keep stdout for the FEN sequence and PGN
+    configure_logging(stream=sys.stderr)
+    from utils import ChessBoard
+
+    # Only tracks the game; the models live in the workers
+    board = ChessBoard(load_models=False)
+    tasks, fps = chunk_tasks(args.source, args.chunk_size, args.step)
+    ort_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    started = time.monotonic()
+    stats = {"frames": 0, "unreadable": 0, "moves": 0, "rejected": 0}
+
+    def observations(executor):
+        for chunk in executor.map(process_chunk, tasks):
+            for observation in chunk:
+                stats["frames"] += 1
+                stats["unreadable"] += observation[1] is None
+                yield observation
+
+    fen_out = open(args.fens, "w") if args.fens else sys.stdout
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(ort_threads,)) as executor:
+            for index, move, fen, error in reconstruct(board, observations(executor), args.settle):
+                seconds = f"{index / fps:.2f}" if fps else ""
+                if error:
+                    stats["rejected"] += 1
+                    print(f"Frame {index}: {error}", file=sys.stderr)
+                    continue
+                stats["moves"] += 1
+                fen_out.write(f"{index}\t{seconds}\t{move}\t{fen}\n")
+    finally:
+        if fen_out is not sys.stdout:
+            fen_out.close()
+
+    game = chess.pgn.Game.from_board(board.chess_board)
+    game.headers["Event"] = "Replay"
+    game.headers["Site"] = os.path.basename(os.path.normpath(args.source))
+    game.headers["Date"] = datetime.date.today().strftime("%Y.%m.%d")
+    if args.pgn:
+        with open(args.pgn, "w") as f:
+            print(game, file=f)
+    else:
+        print(game)
+
+    elapsed = time.monotonic() - started
+    print(
+        f"{stats['frames']} frames in {elapsed:.1f}s ({stats['frames'] / max(elapsed, 1e-9):.1f} frames/s), "
+        f"{stats['unreadable']} without a board, {stats['moves']} moves, {stats['rejected']} rejected",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Tiny stand-in ONNX models and frames for benchmarking without the trained weights.
+
+The models have the same I/O signatures as the real ones, so the whole pipeline
+runs unchanged:
+
+    corner   (1, 3, 640, 640) -> (1, 5, 8400)   YOLO rows [x, y, w, h, score]
+    piece    (N, 3, 64, 64)   -> (N, 2)
+    color    (N, 3, 64, 64)   -> (N, 2)
+
+Each does a small convolution so inference has a real (if modest) cost. The corner
+model always reports the four corners of the board drawn by `synthetic_frame`.
+
+    python -m tools.synthetic_models --output /tmp/synthetic_models
+"""
+
+import argparse
+import os
+
+import cv2
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+from src.libs import classify_color, classify_piece, detect_board
+
+OPSET = 13
+ANCHORS = 8400  # YOLOv8 at 640x640
+FRAME_SIZE = (480, 640)  # (H, W) of synthetic frames
+BOARD_CORNERS = np.array([[120, 40], [520, 40], [520, 440], [120, 440]], dtype=np.float32)
+
+
+def _conv_features(rng, prefix, stride, input_name="input"):
+    """Conv(3->8, 3x3, stride) + ReLU + global average pool -> (N, 8)."""
+    weights = numpy_helper.from_array(
+        (rng.standard_normal((8, 3, 3, 3)) * 0.1).astype(np.float32), f"{prefix}conv_w"
+    )
+    nodes = [
+        helper.make_node("Conv", [input_name, f"{prefix}conv_w"], [f"{prefix}conv"],
+                         kernel_shape=[3, 3], strides=[stride, stride], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", [f"{prefix}conv"], [f"{prefix}relu"]),
+        helper.make_node("GlobalAveragePool", [f"{prefix}relu"], [f"{prefix}pool"]),
+        helper.make_node("Flatten", [f"{prefix}pool"], [f"{prefix}features"], axis=1),
+    ]
+    return nodes, [weights], f"{prefix}features"
+
+
+def _save(nodes, initializers, inputs, outputs, path):
+    graph = helper.make_graph(nodes, os.path.splitext(os.path.basename(path))[0], inputs, outputs, initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", OPSET)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+    return path
+
+
+def classifier_model(path, input_size, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes, initializers, features = _conv_features(rng, "", stride=2)
+    initializers += [
+        numpy_helper.from_array(rng.standard_normal((8, 2)).astype(np.float32), "fc_w"),
+        numpy_helper.from_array(np.zeros(2, dtype=np.float32), "fc_b"),
+    ]
+    nodes.append(helper.make_node("Gemm", [features, "fc_w", "fc_b"], ["logits"]))
+    inputs = [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, input_size, input_size])]
+    outputs = [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["N", 2])]
+    return _save(nodes, initializers, inputs, outputs, path)
+
+
+def corner_model(path, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes, initializers, features = _conv_features(rng, "", stride=8, input_name="images")
+
+    # Fixed detections: four confident boxes on the synthetic board corners, the rest noise
+    size = detect_board.INPUT_SIZE
+    detections = np.zeros((1, 5, ANCHORS), dtype=np.float32)
+    detections[0, :2] = rng.uniform(0, size, (2, ANCHORS))
+    detections[0, 2:4] = 20.0
+    detections[0, 4] = rng.uniform(0, 0.1, ANCHORS)
+    scale = np.array([size / FRAME_SIZE[1], size / FRAME_SIZE[0]], dtype=np.float32)
+    detections[0, :2, :4] = (BOARD_CORNERS * scale).T
+    detections[0, 4, :4] = 0.9
+    initializers.append(numpy_helper.from_array(detections, "detections"))
+
+    # Tie the output to the input so the convolution is not optimized away
+    nodes += [
+        helper.make_node("ReduceMean", [features], ["activity"], axes=[1], keepdims=1),
+        helper.make_node("Sub", ["activity", "activity"], ["zero"]),
+        helper.make_node("Add", ["detections", "zero"], ["output0"]),
+    ]
+    inputs = [helper.make_tensor_value_info("images", TensorProto.FLOAT, [1, 3, size, size])]
+    outputs = [helper.make_tensor_value_info("output0", TensorProto.FLOAT, [1, 5, ANCHORS])]
+    return _save(nodes, initializers, inputs, outputs, path)
+
+
+def write_synthetic_models(directory):
+    """Write the stand-in models to `directory`; returns {name: path}."""
+    os.makedirs(directory, exist_ok=True)
+    return {
+        "corner": corner_model(os.path.join(directory, "yolo_corner.onnx")),
+        "piece": classifier_model(os.path.join(directory, "cnn_piece.onnx"), classify_piece.INPUT_SIZE, seed=1),
+        "color": classifier_model(os.path.join(directory, "cnn_color.onnx"), classify_color.INPUT_SIZE, seed=2),
+    }
+
+
+def synthetic_frame(seed=0):
+    """A BGR camera-sized frame with a chessboard and a few round 'pieces' on it."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 90, (*FRAME_SIZE, 3), dtype=np.uint8)
+    (x0, y0), (x1, _) = BOARD_CORNERS[0].astype(int), BOARD_CORNERS[2].astype(int)
+    # The board is square, so one step covers both axes
+    step = (x1 - x0) // 8
+    for row in range(8):
+        for col in range(8):
+            shade = 200 if (row + col) % 2 == 0 else 90
+            top_left = (x0 + col * step, y0 + row * step)
+            cv2.rectangle(frame, top_left, (top_left[0] + step, top_left[1] + step), (shade,) * 3, -1)
+            if row in (0, 1, 6, 7) and rng.random() < 0.9:
+                colour = (245, 245, 245) if row >= 6 else (20, 20, 20)
+                centre = (top_left[0] + step // 2, top_left[1] + step // 2)
+                cv2.circle(frame, centre, step // 3, colour, -1)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", required=True, help="Directory for the .onnx files")
+    parser.add_argument("--frames", type=int, default=0, help="Also write this many synthetic frames")
+    args = parser.parse_args()
+
+    for name, path in write_synthetic_models(args.output).items():
+        print(f"{name}: {path}")
+    for i in range(args.frames):
+        cv2.imwrite(os.path.join(args.output, f"frame_{i:04d}.png"), synthetic_frame(seed=i))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,31 @@
+import logging
+import os
 import chess
 import cv2
-from src.libs.detect_board import load_model, detect_corners
+import numpy as np
+from src.libs.track_board import CornerTracker
 from src.libs.warp_board import warp_board
-from src.libs.classify_squares import split_board_into_squares
-from src.libs.classify_piece import load_piece_model, classify_piece
-from src.libs.classify_color import load_color_model, classify_color
+from src.libs.classify_squares import (
+    split_board_into_squares,
+    square_thumbnails,
+    square_change_scores,
+)
+from src.libs.classify_piece import (
+    INPUT_SIZE as PIECE_INPUT_SIZE,
+    classify_piece_batch,
+)
+from src.libs.classify_color import (
+    INPUT_SIZE as COLOR_INPUT_SIZE,
+    preprocess_color_batch,
+    classify_color_batch,
+)
+from src.libs.classify_occupancy import classify_square_batch
+from src.libs.model_registry import fused_model_available, get_model
+from src.utils import metrics
+from src.utils.debug_writer import DebugWriter
+from src.utils.metrics import get_logger, log_event
+
+log = get_logger("board")
 
 # Initialize the chess board(8x8 grid with pieces named as W_P, B_P, etc.)
 initial_board = [
@@ -18,10 +39,76 @@ initial_board = [
     ["W_R", "W_N", "W_B", "W_Q", "W_K", "W_B", "W_N", "W_R"],  # Rank 1
 ]
 
-navigation = {
-    f"{r}-{c}": f"{chr(ord('a') + c)}{8 - r}" 
-    for r in range(8) for c in range(8)
-}
+# Corners below this YOLO confidence are treated as missing
+MIN_CORNER_CONFIDENCE = 0.3
+
+# Incremental analysis: a square is reclassified when the mean absolute difference of
+# its downsampled tile exceeds CHANGE_THRESHOLD (pixel values in 0..1). CHANGE_MARGIN
+# more of the most-changed squares are reclassified as a safety margin, and every
+# FULL_REFRESH_INTERVAL frames all 64 are, so misclassifications cannot persist.
+CHANGE_THRESHOLD = 0.04
+CHANGE_MARGIN = 2
+FULL_REFRESH_INTERVAL = 10
+
+# Move detection scores every legal move against the per-square [empty, white, black]
+# probabilities. A move is accepted when it beats the runner-up by MIN_MOVE_MARGIN
+# (log-likelihood, nats) and explains all but MAX_MISMATCHED_SQUARES squares.
+MIN_MOVE_MARGIN = 1.0
+MAX_MISMATCHED_SQUARES = 2
+LABEL_CONFIDENCE = 0.9  # probability given to a hard "E"/"W_*"/"B_*" label
+EMPTY, WHITE, BLACK = 0, 1, 2
+
+# analyse_settled reads one frame incrementally and only falls back to a burst of
+# BURST_SIZE fused frames when the move is rejected or wins by less than
+# BURST_MARGIN nats, so a single blurred or glared frame cannot decide the move
+BURST_SIZE = 3
+BURST_MARGIN = 3.0
+
+# Motion plan locations that are not board squares: captured pieces go to the
+# tray, promotion pieces come from the reserve
+OFF_BOARD = "off"
+RESERVE = "reserve"
+
+def motion_plan(board: chess.Board, move: chess.Move):
+    """The pick-and-place steps that play `move` on a physical board, in order.
+
+    Each step moves one piece: {"piece": "W_P", "from": "e7", "to": "off"}.
+    Captured pieces leave the board before the capturing piece lands, castling
+    moves the king and then the rook, en passant removes the pawn behind the
+    target square, and a promoting pawn is swapped for a piece from the reserve.
+    """
+    piece = board.piece_at(move.from_square)
+    if piece is None:
+        raise ValueError("No piece found on the from-square")
+
+    def step(name, from_, to):
+        return {"piece": name, "from": from_, "to": to}
+
+    steps = []
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        kingside = board.is_kingside_castling(move)
+        king_to = chess.square(6 if kingside else 2, rank)
+        rook_from = chess.square(7 if kingside else 0, rank)
+        rook_to = chess.square(5 if kingside else 3, rank)
+        steps.append(step(_piece_label(piece), chess.square_name(move.from_square), chess.square_name(king_to)))
+        steps.append(step(_piece_label(chess.Piece(chess.ROOK, piece.color)),
+                          chess.square_name(rook_from), chess.square_name(rook_to)))
+        return steps
+
+    if board.is_capture(move):
+        victim_square = move.to_square
+        if board.is_en_passant(move):
+            victim_square = chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square))
+        steps.append(step(_piece_label(board.piece_at(victim_square)), chess.square_name(victim_square), OFF_BOARD))
+
+    if move.promotion:
+        steps.append(step(_piece_label(piece), chess.square_name(move.from_square), OFF_BOARD))
+        steps.append(step(_piece_label(chess.Piece(move.promotion, piece.color)), RESERVE,
+                          chess.square_name(move.to_square)))
+    else:
+        steps.append(step(_piece_label(piece), chess.square_name(move.from_square), chess.square_name(move.to_square)))
+    return steps
 
 def decode_uci_to_json(fen: str, uci_move: str):
     board = chess.Board(fen)
@@ -31,8 +118,6 @@ def decode_uci_to_json(fen: str, uci_move: str):
     if piece is None:
         raise ValueError("No piece found on the from-square")
 
-    piece_name = f"{'W' if piece.color == chess.WHITE else 'B'}_{piece.symbol().upper()}"
-
     # Determine move type
     if board.is_castling(move):
         move_type = "castle"
@@ -40,243 +125,430 @@ def decode_uci_to_json(fen: str, uci_move: str):
         move_type = "capture"
     else:
         move_type = "move"
-    
 
     return {
-        "piece": piece_name,
+        "fen": fen,
+        "move": uci_move,
+        "piece": _piece_label(piece),
         "from": chess.square_name(move.from_square),
         "to": chess.square_name(move.to_square),
-        "type": move_type
+        "type": move_type,
+        "en_passant": board.is_en_passant(move),
+        "promotion": chess.piece_symbol(move.promotion).upper() if move.promotion else None,
+        "steps": motion_plan(board, move),
     }
 
 class ChessBoard:
-    def __init__(self):
-        self.board_matrix = [row[:] for row in initial_board]  # deep copy
-        self.chess_board = chess.Board()  
-        self.model = load_model()
-        self.piece_model = load_piece_model()
-        self.color_model = load_color_model()
-
-    def analyse_board(self, image_url: str):
-        image = cv2.imread(image_url)
+    def __init__(self, change_threshold=CHANGE_THRESHOLD, change_margin=CHANGE_MARGIN,
+                 full_refresh_interval=FULL_REFRESH_INTERVAL, debug_dir=None, fused=None,
+                 load_models=True):
+        # python-chess holds the game; board_matrix and occupancy are derived from it
+        self.chess_board = chess.Board()
+        self.last_move_margin = None
+        # Sessions are shared process-wide, so a new board does not reload the models.
+        # load_models=False gives a board that only tracks the game (apply_board_state)
+        if fused is None:
+            fused = fused_model_available()
+        self.model = get_model("corner") if load_models else None
+        # One three-way empty/white/black model when available (fused=None: if the file
+        # exists), otherwise the piece -> colour cascade
+        self.square_model = get_model("square") if load_models and fused else None
+        self.piece_model = get_model("piece") if load_models and not fused else None
+        self.color_model = get_model("color") if load_models and not fused else None
+        self.corner_tracker = CornerTracker(self.model, min_confidence=MIN_CORNER_CONFIDENCE) if load_models else None
+
+        # Incremental analysis: only squares whose pixels changed are reclassified
+        self.change_threshold = change_threshold
+        self.change_margin = change_margin
+        self.full_refresh_interval = full_refresh_interval
+        self.last_reclassified = 0
+        self._clear_square_cache()
+
+        # Debug artifact dumps are opt-in: pass debug_dir or set CHESS_DEBUG_DIR
+        debug_dir = debug_dir or os.environ.get("CHESS_DEBUG_DIR")
+        self.debug_writer = DebugWriter(debug_dir) if debug_dir else None
+        self._frame_index = 0
+
+    def reset(self):
+        """Start a new game without reloading models or recalibrating the camera."""
+        self.chess_board = chess.Board()
+        self.last_move_margin = None
+        self._clear_square_cache()
+
+    @property
+    def board_matrix(self):
+        """The tracked position as 8x8 "W_K"/"B_P"/"E" labels, rank 8 first."""
+        return [
+            [_piece_label(self.chess_board.piece_at(chess.square(c, 7 - r))) for c in range(8)]
+            for r in range(8)
+        ]
+
+    @property
+    def occupancy(self):
+        """The tracked position as a (64,) EMPTY/WHITE/BLACK array, rank 8 first."""
+        return board_occupancy(self.chess_board)
+
+    def analyse_board(self, image):
+        """Analyse a BGR frame (ndarray) or an image path; see `analyse_frame`."""
+        if isinstance(image, str):
+            image = cv2.imread(image)
         if image is None:
             raise ValueError("Image not found or could not be read.")
+        return self.analyse_frame(image)
 
-        # Detect corners
-        corners = detect_corners(image, self.model)
-        if corners is None or len(corners) != 4:
-            raise ValueError("Could not detect board corners")
-
-        warped_image = warp_board(image, corners)
-        squares = split_board_into_squares(warped_image)
-
-        new_board_state = [["E" for _ in range(8)] for _ in range(8)]
-
-        for square in squares:
-            row, col = square["row"], square["col"]
-            img = square["image"]
-            piece_or_empty = classify_piece(img, self.piece_model)
-            
-            if piece_or_empty == "piece":
-                color = classify_color(img, self.color_model)
-                code = "W_P" if color == "white" else "B_P"
-                # Fallback as pawn until we have a type detector
-                new_board_state[row][col] = code
-            else:
-                new_board_state[row][col] = "E"
-        
-        #  write new and old board state to a .txt file for comparison
-        with open("old_board_state.txt", "w") as f:
-            for row in self.board_matrix:
-                f.write(" ".join(row) + "\n")
-        with open("new_board_state.txt", "w") as f:
-            for row in new_board_state:
-                f.write(" ".join(row) + "\n")
-        
-        
-
-        move_uci = self._detect_move(self.board_matrix, new_board_state)
-        if move_uci:
-            try:
-                move = chess.Move.from_uci(move_uci)
-                if move in self.chess_board.legal_moves:
-                    self.chess_board.push(move)
-                    # Update board matrix
-                    if move_uci in ["e1g1", "e1c1", "e8g8", "e8c8"]:
-                        print(f"Castling detected: {move_uci}")
-                        # Handle castling
-                        if move_uci == "e1g1":
-                            # White kingside castling
-                            self.board_matrix[7][5] = "W_R"
-                            self.board_matrix[7][6] = "W_K"
-                            self.board_matrix[7][4] = "E"
-                            self.board_matrix[7][7] = "E"
-                        elif move_uci == "e1c1":
-                            # White queenside castling
-                            self.board_matrix[7][2] = "W_K"
-                            self.board_matrix[7][3] = "W_R"
-                            self.board_matrix[7][4] = "E"
-                            self.board_matrix[7][0] = "E"
-                        elif move_uci == "e8g8":
-                            # Black kingside castling
-                            self.board_matrix[0][5] = "B_R"
-                            self.board_matrix[0][6] = "B_K"
-                            self.board_matrix[0][4] = "E"
-                            self.board_matrix[0][7] = "E"
-                        elif move_uci == "e8c8":
-                            # Black queenside castling
-                            self.board_matrix[0][2] = "B_K"
-                            self.board_matrix[0][3] = "B_R"
-                            self.board_matrix[0][4] = "E"
-                            self.board_matrix[0][0] = "E"
-                    else:
-                    # Regular move
-                    # Update the board matrix with the move
-                        fr, fc = self._coord_from_square(move_uci[:2])
-                        tr, tc = self._coord_from_square(move_uci[2:])
-                        self.board_matrix[tr][tc] = self.board_matrix[fr][fc]
-                        self.board_matrix[fr][fc] = "E"
-                    print(f"Move detected: {move_uci}")
-                    return self.chess_board.fen()
-                else:
-                    print(f"Illegal move detected: {move_uci}")
-                    raise ValueError(f"Illegal move detected: {move_uci}")
-            except Exception as e:
-                print(e.args[0])
-                raise ValueError(e.args[0])
+    def analyse_frame(self, image):
+        """Detect the move played since the last frame and return the new FEN."""
+        with metrics.span("analyse_frame_seconds", mode="frame"):
+            return self._analyse_frame(image)
+
+    def _analyse_frame(self, image):
+        self._frame_index += 1
+        if self.debug_writer:
+            self.debug_writer.write_image(f"{self._frame_index:04d}_capture.jpeg", image)
+
+        new_board_state = self.read_board_state(image)
+        return self._apply_observation(new_board_state)
+
+    def analyse_settled(self, frame, capture=None, fusion="mean"):
+        """`analyse_frame` on a still board, confirmed by a burst only when in doubt.
+
+        The frame goes through the incremental path, which reclassifies only the
+        squares that changed. When that raises ValueError, or the detected move
+        wins by less than BURST_MARGIN, `capture(n)` is asked for n more frames of
+        the same board and `analyse_burst` decides instead. Without `capture` the
+        single-frame result (or error) stands.
+        """
+        moves_before = len(self.chess_board.move_stack)
+        try:
+            fen = self.analyse_frame(frame)
+        except ValueError as e:
+            if capture is None:
+                raise
+            reason = str(e)
         else:
-            print("No valid move detected")
+            if capture is None or self.last_move_margin >= BURST_MARGIN:
+                return fen
+            reason = f"low margin {self.last_move_margin:.2f}"
+            # The burst decides the move again from the position before it
+            while len(self.chess_board.move_stack) > moves_before:
+                self.chess_board.pop()
+
+        metrics.inc("burst_fallbacks")
+        log_event(log, "burst_fallback", reason=reason)
+        return self.analyse_burst([frame] + list(capture(BURST_SIZE - 1)), fusion)
+
+    def analyse_burst(self, frames, fusion="mean"):
+        """Like `analyse_frame`, but for several frames of the same position.
+
+        The corners are located once, on the first frame, and that homography warps
+        every frame. All K x 64 squares are classified in one batch, and the
+        per-square probabilities are fused ("mean" or "majority" vote) before move
+        detection, so one blurred frame or a glare patch does not decide the move.
+        """
+        if not frames:
+            raise ValueError("Burst contains no frames")
+        with metrics.span("analyse_frame_seconds", mode="burst"):
+            self._frame_index += 1
+            if self.debug_writer:
+                self.debug_writer.write_image(f"{self._frame_index:04d}_capture.jpeg", frames[0])
+
+            corners = self._locate_corners(frames[0])
+            with metrics.span("analyse_stage_seconds", stage="warp"):
+                matrix = self.corner_tracker.matrix(8 * PIECE_INPUT_SIZE)
+                warped_images = [
+                    warp_board(frame, corners, square_size=PIECE_INPUT_SIZE, matrix=matrix) for frame in frames
+                ]
+                batch = np.concatenate([split_board_into_squares(w, as_tensor=True) for w in warped_images])
+
+            with metrics.span("analyse_stage_seconds", stage="classify"):
+                probs = self._square_probabilities(batch, warped_images, np.arange(len(batch)))
+                probs = fuse_square_probs(probs.reshape(len(frames), 64, 3), fusion)
+
+            # A burst is a full refresh: restart the incremental cache from it
+            self._square_probs = probs
+            self._square_labels = probs_to_labels(probs)
+            self._prev_thumbs = square_thumbnails(batch[-64:])
+            self._cache_corners = corners.copy()
+            self._frames_since_refresh = 0
+            self.last_reclassified = 64
+
+            new_board_state = [self._square_labels[r * 8:(r + 1) * 8] for r in range(8)]
+            return self._apply_observation(new_board_state)
+
+    def _apply_observation(self, new_board_state):
+        #  dump new and old board state for comparison (opt-in, written in the background)
+        if self.debug_writer:
+            self.debug_writer.write_board(f"{self._frame_index:04d}_old_board_state.txt", self.board_matrix)
+            self.debug_writer.write_board(f"{self._frame_index:04d}_new_board_state.txt", new_board_state)
+
+        with metrics.span("analyse_stage_seconds", stage="detect_move"):
+            return self.apply_board_state(new_board_state, self._square_probs)
+
+    def read_board_state(self, image):
+        """Run the vision models on a BGR frame and return the observed 8x8 "E"/"W_P"/"B_P" grid."""
+        corners = self._locate_corners(image)
+
+        # Warp straight to classifier resolution and slice all squares as one tensor
+        with metrics.span("analyse_stage_seconds", stage="warp"):
+            warped_image = warp_board(
+                image, corners, square_size=PIECE_INPUT_SIZE,
+                matrix=self.corner_tracker.matrix(8 * PIECE_INPUT_SIZE),
+            )
+            piece_batch = split_board_into_squares(warped_image, as_tensor=True)
+
+        with metrics.span("analyse_stage_seconds", stage="classify"):
+            new_board_state = self._classify_squares(piece_batch, warped_image)
+        metrics.inc("squares_reclassified", self.last_reclassified)
+        log_event(log, "squares_reclassified", logging.DEBUG, count=self.last_reclassified)
+        return new_board_state
+
+    def _locate_corners(self, image):
+        # Detect corners, reusing the cached ones while the camera has not moved
+        with metrics.span("analyse_stage_seconds", stage="corners"):
+            corners, corner_scores = self.corner_tracker.locate(image)
+        if corners is None or len(corners) != 4:
+            metrics.inc("detection_failures", reason="corners")
+            raise ValueError(
+                f"Could not detect board corners (found {len(corners)} with confidence "
+                f"{[round(float(c), 2) for c in corner_scores]})"
+            )
+        return corners
+
+    def apply_board_state(self, new_board_state, square_probs=None):
+        """Play the move that turns the tracked position into the observed board.
+
+        `square_probs` are the (64, 3) [empty, white, black] classifier probabilities;
+        without them the 8x8 `new_board_state` labels are used as confident
+        observations. Returns the FEN afterwards (unchanged when no move is seen)
+        and raises ValueError when no legal move explains the board, or when two
+        moves explain it almost equally well.
+        """
+        if square_probs is None:
+            square_probs = labels_to_probs(new_board_state)
+        move, margin, mismatched = self._detect_move(square_probs)
+        self.last_move_margin = margin
+
+        if mismatched > MAX_MISMATCHED_SQUARES:
+            metrics.inc("illegal_moves")
+            log_event(log, "move_rejected", logging.WARNING, mismatched=mismatched)
+            raise ValueError(f"Observed board matches no legal move ({mismatched} squares differ)")
+        if move is None:
+            metrics.inc("no_move_detected")
+            log_event(log, "no_move_detected", margin=round(margin, 2))
+            return self.chess_board.fen()
+        if margin < MIN_MOVE_MARGIN:
+            metrics.inc("ambiguous_moves")
+            log_event(log, "move_rejected", logging.WARNING, move=move.uci(), margin=round(margin, 2))
+            raise ValueError(f"Ambiguous move detected: {move.uci()} (margin {margin:.2f})")
+
+        if self.chess_board.is_castling(move):
+            log_event(log, "castling_detected", move=move.uci())
+        self.chess_board.push(move)
+        metrics.inc("moves_detected")
+        log_event(log, "move_detected", move=move.uci(), margin=round(margin, 2), fen=self.chess_board.fen())
         return self.chess_board.fen()
 
-    def _detect_move(self, old_board, new_board):
-        from_sqs = []
-        to_sqs = []
-
-        for r in range(8):
-            for c in range(8):
-                old = old_board[r][c]
-                new = new_board[r][c]
-
-                if old != "E" and new == "E":
-                    from_sqs.append((r, c))
-                if (old == "E" and new != "E") or \
-                   (old.startswith("W") and new.startswith("B")) or \
-                   (old.startswith("B") and new.startswith("W")):
-                    to_sqs.append((r, c))
-
-        print(f"from_sqs: {from_sqs}, to_sqs: {to_sqs}")
-
-        # Handle castling: two froms and two tos, try to find a valid king move
-        if len(from_sqs) == 2 and len(to_sqs) == 2:
-            # Try all from-to pairs, look for a king move that is a valid castle
-            for f in from_sqs:
-                for t in to_sqs:
-                    piece = self.board_matrix[f[0]][f[1]]
-                    if not piece.endswith("K"):
-                        continue
-                    from_square = navigation[f"{f[0]}-{f[1]}"]
-                    to_square = navigation[f"{t[0]}-{t[1]}"]
-                    uci = from_square + to_square
-                    try:
-                        move = chess.Move.from_uci(uci)
-                        if move in self.chess_board.legal_moves and self.chess_board.is_castling(move):
-                            return uci
-                    except Exception:
-                        continue
-        # Normal move (single from and to)
-        if len(from_sqs) == 1 and len(to_sqs) == 1:
-            from_square = navigation[f"{from_sqs[0][0]}-{from_sqs[0][1]}"]
-            to_square = navigation[f"{to_sqs[0][0]}-{to_sqs[0][1]}"]
-            return from_square + to_square
-        # Fallback: try to return the first possible move
-        if from_sqs and to_sqs:
-            from_square = navigation[f"{from_sqs[0][0]}-{from_sqs[0][1]}"]
-            to_square = navigation[f"{to_sqs[0][0]}-{to_sqs[0][1]}"]
-            return from_square + to_square
-        return None
-
-    def _coord_from_square(self, square):
-        col = ord(square[0]) - ord('a')
-        row = 8 - int(square[1])
-        return (row, col)
+    def _classify_squares(self, piece_batch, warped_image):
+        """Classify the (64, C, H, W) square tensor into an 8x8 grid of "E"/"W_P"/"B_P" labels.
+
+        Squares whose pixels have not changed since the previous frame reuse their
+        cached labels; the count actually reclassified is kept in `last_reclassified`.
+        """
+        thumbs = square_thumbnails(piece_batch)
+        corners = self.corner_tracker.corners
+
+        full_refresh = (
+            self._prev_thumbs is None
+            or self._frames_since_refresh + 1 >= self.full_refresh_interval
+            or not np.array_equal(corners, self._cache_corners)
+        )
+        if full_refresh:
+            todo = np.arange(64)
+            self._frames_since_refresh = 0
+        else:
+            scores = square_change_scores(self._prev_thumbs, thumbs)
+            n_changed = int((scores > self.change_threshold).sum())
+            todo = np.sort(np.argsort(-scores)[:n_changed + self.change_margin])
+            self._frames_since_refresh += 1
+
+        if len(todo):
+            probs = self._square_probabilities(piece_batch[todo], [warped_image], todo)
+            self._square_probs[todo] = probs
+            for i, label in zip(todo, probs_to_labels(probs)):
+                self._square_labels[i] = label
+
+        self._prev_thumbs = thumbs
+        self._cache_corners = None if corners is None else corners.copy()
+        self.last_reclassified = len(todo)
+
+        return [self._square_labels[r * 8:(r + 1) * 8] for r in range(8)]
+
+    def _square_probabilities(self, batch, warped_images, indices):
+        """(N, 3) [empty, white, black] probabilities for an (N, C, H, W) square batch.
+
+        Row i is square indices[i] % 64 of warped_images[indices[i] // 64]; the
+        warped boards are only cut up again when the colour model takes another size.
+        """
+        if self.square_model is not None:
+            with metrics.span("inference_seconds", model="square"):
+                _, probs = classify_square_batch(batch, self.square_model)
+            return probs
+
+        with metrics.span("inference_seconds", model="piece"):
+            piece_labels, piece_probs = classify_piece_batch(batch, self.piece_model)
+
+        occupied = [i for i, label in enumerate(piece_labels) if label == "piece"]
+        if COLOR_INPUT_SIZE == PIECE_INPUT_SIZE:
+            color_batch = batch[occupied]
+        else:
+            squares = {}
+            crops = []
+            for i in occupied:
+                board_index, square = divmod(int(indices[i]), 64)
+                if board_index not in squares:
+                    squares[board_index] = split_board_into_squares(warped_images[board_index])
+                crops.append(squares[board_index][square]["image"])
+            color_batch = preprocess_color_batch(crops)
+        with metrics.span("inference_seconds", model="color"):
+            _, color_probs = classify_color_batch(color_batch, self.color_model)
+
+        # Colour is unknown for squares classified empty
+        p_white = np.full(len(batch), 0.5, dtype=np.float32)
+        p_white[occupied] = color_probs[:, 1]
+        p_piece = piece_probs[:, 1]
+        return np.stack([1.0 - p_piece, p_piece * p_white, p_piece * (1.0 - p_white)], axis=1)
+
+    def _clear_square_cache(self):
+        self._prev_thumbs = None
+        self._cache_corners = None
+        self._frames_since_refresh = 0
+        self._square_labels = ["E"] * 64
+        # Per-square [empty, white, black] probabilities
+        self._square_probs = np.zeros((64, 3), dtype=np.float32)
+
+    def _detect_move(self, square_probs):
+        """Maximum-likelihood explanation of `square_probs` (64 x [empty, white, black]).
+
+        Every legal move, plus "no move", is turned into the occupancy it would
+        leave and scored by the summed per-square log-probability in one
+        vectorized pass. Castling, en passant and promotion change occupancy like
+        any other move; promotions are scored once as a queen, because piece types
+        are not observed. Returns (move or None, margin over the runner-up in nats,
+        number of squares the winner disagrees with the classifier on).
+        """
+        board = self.chess_board
+        moves = [m for m in board.legal_moves if m.promotion in (None, chess.QUEEN)]
+        mover = WHITE if board.turn == chess.WHITE else BLACK
+
+        # Row i is the occupancy after moves[i]; the last row is "no move"
+        expected = np.tile(board_occupancy(board), (len(moves) + 1, 1))
+        rows, squares, values = [], [], []
+        for i, move in enumerate(moves):
+            changes = [(move.from_square, EMPTY), (move.to_square, mover)]
+            if board.is_en_passant(move):
+                changes.append((move.to_square + (-8 if mover == WHITE else 8), EMPTY))
+            elif board.is_castling(move):
+                rank = chess.square_rank(move.from_square)
+                kingside = board.is_kingside_castling(move)
+                rook_from = chess.square(7 if kingside else 0, rank)
+                rook_to = chess.square(5 if kingside else 3, rank)
+                king_to = chess.square(6 if kingside else 2, rank)
+                changes = [(move.from_square, EMPTY), (rook_from, EMPTY), (king_to, mover), (rook_to, mover)]
+            for square, value in changes:
+                rows.append(i)
+                squares.append(square ^ 56)  # python-chess a1=0 -> rank-8-first index
+                values.append(value)
+        expected[rows, squares] = values
+
+        log_probs = np.log(np.clip(square_probs, 1e-4, 1.0))
+        scores = log_probs[np.arange(64), expected].sum(axis=1)
+
+        order = np.argsort(-scores)
+        best = int(order[0])
+        margin = float(scores[best] - scores[order[1]]) if len(order) > 1 else float("inf")
+        mismatched = int((np.asarray(square_probs).argmax(axis=1) != expected[best]).sum())
+        log_event(log, "move_scores", logging.DEBUG, best=best, margin=round(margin, 2), mismatched=mismatched)
+        return (moves[best] if best < len(moves) else None), margin, mismatched
+
     
     def make_move(self, color: str, uci_move: str):
         try:
             move = chess.Move.from_uci(uci_move)
-        except:
+        except ValueError:
             raise ValueError(f"Invalid UCI format: {uci_move}")
-        
+
         if move not in self.chess_board.legal_moves:
             raise ValueError(f"Illegal move: {uci_move}")
 
-        # Update python-chess board
+        # Check that the right color is moving
+        piece = _piece_label(self.chess_board.piece_at(move.from_square))
+        if color == "W" and not piece.startswith("W_"):
+            raise ValueError(f"No white piece at {uci_move[:2]}")
+        if color == "B" and not piece.startswith("B_"):
+            raise ValueError(f"No black piece at {uci_move[:2]}")
+
+        if self.chess_board.is_castling(move):
+            log_event(log, "castling_detected", move=uci_move)
         self.chess_board.push(move)
-        
-        # Handle castling
-        if uci_move in ["e1g1", "e1c1", "e8g8", "e8c8"]:
-            print(f"Castling detected: {uci_move}")
-            # Exchange the rook and king positions
-            if uci_move == "e1g1":
-                # White kingside castling
-                # self.chess_board.set_piece_at(chess.E1, chess.Piece(chess.ROOK, chess.WHITE))
-                # self.chess_board.set_piece_at(chess.G1, chess.Piece(chess.KING, chess.WHITE))
-                # Update the board matrix
-                self.board_matrix[7][5] = "W_R"  # F1
-                self.board_matrix[7][6] = "W_K"  # G1
-                self.board_matrix[7][4] = "E"
-                self.board_matrix[7][7] = "E"
-            elif uci_move == "e1c1":
-                # White queenside castling
-                # self.chess_board.set_piece_at(chess.D1, chess.Piece(chess.ROOK, chess.WHITE))
-                # self.chess_board.set_piece_at(chess.A1, chess.Piece(chess.KING, chess.WHITE))
-                # Update the board matrix
-                self.board_matrix[7][2] = "W_K"
-                self.board_matrix[7][3] = "W_R"
-                self.board_matrix[7][4] = "E"
-                self.board_matrix[7][0] = "E"
-            elif uci_move == "e8g8":
-                # Black kingside castling
-                # self.chess_board.set_piece_at(chess.F8, chess.Piece(chess.ROOK, chess.BLACK))
-                # self.chess_board.set_piece_at(chess.H8, chess.Piece(chess.KING, chess.BLACK))
-                # Update the board matrix
-                self.board_matrix[0][5] = "B_R"
-                self.board_matrix[0][6] = "B_K"
-                self.board_matrix[0][4] = "E"
-                self.board_matrix[0][7] = "E"
-            elif uci_move == "e8c8":
-                # Black queenside castling
-                # self.chess_board.set_piece_at(chess.D8, chess.Piece(chess.ROOK, chess.BLACK))
-                # self.chess_board.set_piece_at(chess.A8, chess.Piece(chess.KING, chess.BLACK))
-                # Update the board matrix
-                self.board_matrix[0][2] = "B_K"
-                self.board_matrix[0][3] = "B_R"
-                self.board_matrix[0][4] = "E"
-                self.board_matrix[0][0] = "E"
-        else:
-        # Update our matrix
-            from_sq = move.from_square
-            to_sq = move.to_square
-            from_row = 7 - chess.square_rank(from_sq)
-            from_col = chess.square_file(from_sq)
-            to_row = 7 - chess.square_rank(to_sq)
-            to_col = chess.square_file(to_sq)
-
-            piece = self.board_matrix[from_row][from_col]
-
-            # Check that the right color is moving
-            if color == "W" and not piece.startswith("W_"):
-                raise ValueError(f"No white piece at {uci_move[:2]}")
-            if color == "B" and not piece.startswith("B_"):
-                raise ValueError(f"No black piece at {uci_move[:2]}")
-
-            self.board_matrix[to_row][to_col] = piece
-            self.board_matrix[from_row][from_col] = "E"
-
-        print(f"Move applied: {piece} {uci_move[:2]} -> {uci_move[2:]}")
-        # write the board to a .txt file
-        with open("chess_board.txt", "w") as f:
-            for row in self.board_matrix:
-                f.write(" ".join(row) + "\n")
-        print(f"FEN: {self.chess_board.fen()}")
-    
-    
\ No newline at end of file
+
+        log_event(log, "move_applied", piece=piece, move=uci_move)
+        # dump the board (opt-in, written in the background)
+        if self.debug_writer:
+            self.debug_writer.write_board(f"{self._frame_index:04d}_chess_board.txt", self.board_matrix)
+        log_event(log, "board_position", fen=self.chess_board.fen())
+
+
+def _piece_label(piece):
+    if piece is None:
+        return "E"
+    return f"{'W' if piece.color == chess.WHITE else 'B'}_{piece.symbol().upper()}"
+
+
+def board_occupancy(board):
+    """(64,) int8 EMPTY/WHITE/BLACK array for a python-chess board, rank 8 first."""
+    bitboards = np.array([board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]], dtype=">u8")
+    # Bit i of a bitboard is square i (a1=0); flip to get rank 8 first like the camera grid
+    bits = np.unpackbits(bitboards.view(np.uint8)).reshape(2, 8, 8)[:, :, ::-1]
+    return (bits[0] * WHITE + bits[1] * BLACK).astype(np.int8).reshape(64)
+
+
+def labels_to_probs(board_state, confidence=LABEL_CONFIDENCE):
+    """(64, 3) [empty, white, black] probabilities for an 8x8 grid of hard labels."""
+    classes = np.array([
+        EMPTY if label == "E" else WHITE if label.startswith("W") else BLACK
+        for row in board_state for label in row
+    ])
+    probs = np.full((64, 3), (1.0 - confidence) / 2, dtype=np.float32)
+    probs[np.arange(64), classes] = confidence
+    return probs
+
+
+def probs_to_classes(probs):
+    """EMPTY/WHITE/BLACK per row of (..., 3) [empty, white, black] probabilities.
+
+    A square is occupied when P(empty) < 0.5, matching the piece classifier's decision.
+    """
+    probs = np.asarray(probs)
+    return np.where(probs[..., 0] >= 0.5, EMPTY, np.where(probs[..., 1] >= probs[..., 2], WHITE, BLACK))
+
+
+def probs_to_labels(probs):
+    """Board labels for (N, 3) probabilities; pieces are pawns until there is a type classifier."""
+    return [("E", "W_P", "B_P")[c] for c in probs_to_classes(probs)]
+
+
+def fuse_square_probs(probs, fusion="mean"):
+    """Fuse (K, 64, 3) per-frame square probabilities into one (64, 3) observation.
+
+    "mean" averages the probabilities; "majority" gives each square the share of
+    frames voting for each class, so a single outlier frame cannot flip it.
+    """
+    probs = np.asarray(probs, dtype=np.float32)
+    if fusion == "mean":
+        return probs.mean(axis=0)
+    if fusion == "majority":
+        votes = np.zeros(probs.shape[1:], dtype=np.float32)
+        for frame_classes in probs_to_classes(probs):
+            votes[np.arange(probs.shape[1]), frame_classes] += 1
+        return votes / len(probs)
+    raise ValueError(f"Unknown fusion {fusion!r}, expected 'mean' or 'majority'")